@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日記の連続性（記憶）管理モジュール
+直近の日記の要約・よく登場する人物・継続中の因縁（黒ずくめの組織など）を
+一定の大きさに収まるよう保持し、次の日のプロンプトに差し込む文章を作成します
+"""
+
+import re
+from collections import deque
+
+# 保持する直近の日数
+RECENT_DAYS = 7
+# 1日分の要約の最大文字数
+SUMMARY_CHARS = 80
+# 差し込む記憶のトークン数の上限（日本語は1文字≒1トークンとして概算）
+TOKEN_BUDGET = 400
+# 人物の登場回数に掛ける1日ごとの減衰率と、記憶から外す下限
+CHARACTER_DECAY = 0.9
+CHARACTER_MIN_WEIGHT = 0.05
+TOP_CHARACTERS = 8
+# 主人公は毎日登場するため、よく登場する人物からは除外
+EXCLUDED_CHARACTERS = {'江戸川コナン'}
+
+# 継続中の因縁として追跡するキーワード（エピソードのタイトル・概要から検出）
+THREAD_KEYWORDS = {
+    '黒ずくめの組織': ['黒ずくめ', 'ベルモット', 'ウォッカ', 'バーボン', 'キール', 'APTX4869'],
+    '怪盗キッド': ['怪盗キッド'],
+    'FBI': ['FBI', '赤井'],
+    '公安': ['公安', '降谷', '安室'],
+}
+
+_WORLD_PATTERN = re.compile(r'^\s*- パラレルワールド[A-Z]+:', re.MULTILINE)
+_TITLE_PATTERN = re.compile(r'エピソードタイトル:\s*(.+)')
+_SUMMARY_PATTERN = re.compile(r'事件の概要:\s*(.+)')
+_CHARACTERS_PATTERN = re.compile(r'主要登場人物:\s*(.+)')
+_DATE_LINE_PATTERN = re.compile(r'^\d{4}年\d{1,2}月\d{1,2}日$')
+
+
+def estimate_tokens(text):
+    """
+    トークン数を概算します（日本語中心のため1文字を1トークンとして数える）
+
+    Args:
+        text: 対象の文字列
+
+    Returns:
+        int: 概算トークン数
+    """
+    return len(text)
+
+
+def parse_prompt(prompt):
+    """
+    create_prompts.pyが作成したプロンプトからエピソード情報を取り出します
+
+    Args:
+        prompt: 生成プロンプト
+
+    Returns:
+        dict: {'titles': タイトルのリスト, 'summaries': 概要のリスト, 'characters': 人物のリスト,
+               'episodes': エピソードごとの {'title', 'summary'} のリスト}
+    """
+    # パラレルワールドごとのブロックに分け、タイトルと概要を同じエピソードとして対応づける
+    episodes = []
+    for block in _WORLD_PATTERN.split(prompt)[1:]:
+        title = _TITLE_PATTERN.search(block)
+        summary = _SUMMARY_PATTERN.search(block)
+        episodes.append({
+            'title': title.group(1).strip() if title else '',
+            'summary': summary.group(1).strip() if summary else '',
+        })
+
+    characters = []
+    for line in _CHARACTERS_PATTERN.findall(prompt):
+        for name in line.split(','):
+            name = name.strip()
+            if name and name != 'nan' and name not in characters:
+                characters.append(name)
+    return {
+        'titles': [title.strip() for title in _TITLE_PATTERN.findall(prompt)],
+        'summaries': [summary.strip() for summary in _SUMMARY_PATTERN.findall(prompt)],
+        'characters': characters,
+        'episodes': episodes,
+    }
+
+
+def summarize_diary(diary, max_chars=SUMMARY_CHARS):
+    """
+    日記本文から短い要約（冒頭の一文）を作成します
+
+    Args:
+        diary: 生成された日記
+        max_chars: 要約の最大文字数
+
+    Returns:
+        str: 要約
+    """
+    lines = []
+    for line in str(diary).splitlines():
+        line = line.strip()
+        # 生成時に付与される日付行、Markdownの見出し・コメント、空行は除外
+        if not line or line.startswith(('#', '<!--')) or _DATE_LINE_PATTERN.match(line):
+            continue
+        lines.append(line)
+    text = ''.join(lines)
+    if '。' in text:
+        text = text.split('。')[0] + '。'
+    if len(text) > max_chars:
+        return text[:max_chars - 1] + '…'
+    return text
+
+
+class ContinuityStore:
+    """
+    直近の日記・人物・因縁を一定量だけ保持する記憶
+
+    update() で1日分の結果を取り込み、render() で次の日のプロンプトに
+    差し込む文章をトークン上限内で作成します。保持する量は日数に依存しません。
+    """
+
+    def __init__(self, recent_days=RECENT_DAYS, token_budget=TOKEN_BUDGET):
+        """
+        Args:
+            recent_days: 要約を保持する直近の日数
+            token_budget: render() が返す文章のトークン数の上限
+        """
+        self.recent = deque(maxlen=recent_days)
+        self.token_budget = token_budget
+        self.characters = {}
+        self.threads = {}
+
+    def update(self, date_str, prompt, diary):
+        """
+        1日分の結果を記憶に取り込みます
+
+        Args:
+            date_str: 日付
+            prompt: その日の生成プロンプト
+            diary: その日に生成された日記
+        """
+        info = parse_prompt(prompt)
+        titles = info['titles']
+
+        self.recent.append({
+            'date': date_str,
+            'titles': titles,
+            'summary': summarize_diary(diary),
+        })
+
+        # 人物の登場回数は日ごとに減衰させ、ほとんど登場しなくなった人物は忘れる
+        for name in list(self.characters):
+            self.characters[name] *= CHARACTER_DECAY
+            if self.characters[name] < CHARACTER_MIN_WEIGHT:
+                del self.characters[name]
+        for name in info['characters']:
+            if name not in EXCLUDED_CHARACTERS:
+                self.characters[name] = self.characters.get(name, 0.0) + 1.0
+
+        # キーワードはエピソードごとに照合し、実際に該当したエピソードのタイトルを記録する
+        for thread, keywords in THREAD_KEYWORDS.items():
+            matched = [
+                episode for episode in info['episodes']
+                if any(keyword in f"{episode['title']} {episode['summary']}" for keyword in keywords)
+            ]
+            if matched:
+                entry = self.threads.setdefault(thread, {'count': 0})
+                entry['count'] += 1
+                entry['last_date'] = date_str
+                entry['last_title'] = matched[0]['title']
+
+    def render(self, token_budget=None):
+        """
+        次の日のプロンプトに差し込む記憶の文章を作成します
+
+        因縁・人物を優先し、残りの枠に新しい日から順に要約を入れます。
+
+        Args:
+            token_budget: トークン数の上限（省略時は初期化時の値）
+
+        Returns:
+            str: 記憶の文章（記憶がない場合は空文字列）
+        """
+        if not self.recent:
+            return ''
+        budget = self.token_budget if token_budget is None else token_budget
+
+        header = "これまでの日記の記憶（内容に自然に触れてもよい）:"
+        sections = []
+        if self.threads:
+            thread_lines = [
+                f"- {thread}: 直近 {entry['last_date']}「{entry['last_title']}」（累計{entry['count']}回）"
+                for thread, entry in sorted(self.threads.items(), key=lambda item: item[1]['last_date'], reverse=True)
+            ]
+            sections.append("継続中の因縁:\n" + '\n'.join(thread_lines))
+        if self.characters:
+            top = sorted(self.characters.items(), key=lambda item: item[1], reverse=True)[:TOP_CHARACTERS]
+            sections.append("よく会う人物: " + '、'.join(name for name, _ in top))
+
+        text = header
+        for section in sections:
+            candidate = f"{text}\n{section}"
+            if estimate_tokens(candidate) <= budget:
+                text = candidate
+
+        # 新しい日から順に、上限に収まる分だけ要約を入れる
+        day_lines = []
+        used = estimate_tokens(text) + estimate_tokens("\n最近の日記:")
+        for day in reversed(self.recent):
+            title = '／'.join(day['titles'][:2])
+            line = f"\n- {day['date']}「{title}」: {day['summary']}"
+            if used + estimate_tokens(line) > budget:
+                break
+            day_lines.append(line)
+            used += estimate_tokens(line)
+        if day_lines:
+            text += "\n最近の日記:" + ''.join(reversed(day_lines))
+
+        return text if estimate_tokens(text) <= budget else ''
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+レイテンシ集計モジュール
+リクエストのレイテンシから平均・p50・p95・最大を計算します
+"""
+
+
+def percentile(sorted_values, p):
+    """
+    昇順に並んだ値のパーセンタイル（最近傍法）を返します
+
+    Args:
+        sorted_values: 昇順に並んだ値のリスト
+        p: 0～1のパーセンタイル
+
+    Returns:
+        float: パーセンタイル値（値がない場合は0.0）
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def summarize_latencies(latencies):
+    """
+    レイテンシのリストを集計します
+
+    Args:
+        latencies: レイテンシ（秒）のイテラブル
+
+    Returns:
+        dict: {'count', 'mean', 'p50', 'p95', 'max'}
+    """
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'max': values[-1] if values else 0.0,
+    }
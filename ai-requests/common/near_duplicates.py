@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+類似日記検出モジュール
+生成された日記を文字n-gramに分割してMinHash署名を作り、LSH（局所性鋭敏型ハッシュ）の
+バケットに逐次登録することで、ほぼ同じ内容の日記をペア比較なしで検出します
+"""
+
+import random
+import re
+import zlib
+
+import numpy as np
+
+# 既定の設定
+THRESHOLD = 0.8       # 類似とみなす推定Jaccard係数の下限
+NUM_PERM = 128        # MinHash署名の長さ
+BANDS = 16            # LSHのバンド数（1バンドあたり NUM_PERM / BANDS 行）
+SHINGLE_SIZE = 5      # 文字n-gramのn
+MAX_BUCKET_SIZE = 50  # 1バケットに保持する最大件数（完全一致が大量にあっても登録を定数時間に保つ）
+
+# ハッシュ関数 (a * h + b) mod p の定数。h < 2^32, a < 2^31 のため積はuint64に収まる
+_PRIME = (1 << 32) + 15
+_MAX_A = 1 << 31
+_MAX_HASH = (1 << 32) - 1
+_DATE_LINE_PATTERN = re.compile(r'^\s*\d{4}年\d{1,2}月\d{1,2}日\s*$', re.MULTILINE)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    日記を正規化し、文字n-gramの集合に変換します
+
+    生成時に付与される日付行と空白は比較の対象外とします。
+
+    Args:
+        text: 日記
+        size: n-gramの文字数
+
+    Returns:
+        set: 文字n-gramのハッシュ値（32bit）の集合
+    """
+    text = _DATE_LINE_PATTERN.sub('', str(text))
+    text = _WHITESPACE_PATTERN.sub('', text).lower()
+    if len(text) <= size:
+        return {zlib.crc32(text.encode('utf-8'))}
+    return {zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSHによる類似日記のインデックス
+
+    add() で日記を1件ずつ登録すると、登録済みの類似日記を返します。
+    類似した日記はUnion-Findでクラスタにまとめられ、clusters() で取得できます。
+    1件の登録にかかる時間は登録済みの件数にほぼ依存しません。
+    """
+
+    def __init__(self, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS,
+                 shingle_size=SHINGLE_SIZE, max_bucket_size=MAX_BUCKET_SIZE, seed=1):
+        """
+        Args:
+            threshold: 類似とみなす推定Jaccard係数の下限
+            num_perm: MinHash署名の長さ
+            bands: LSHのバンド数（num_permを割り切れる値）
+            shingle_size: 文字n-gramのn
+            max_bucket_size: 1バケットに保持する最大件数
+            seed: ハッシュ関数の乱数シード
+        """
+        if num_perm % bands != 0:
+            raise ValueError("num_perm は bands で割り切れる値を指定してください")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_bucket_size = max_bucket_size
+        self.seed = seed
+
+        rng = random.Random(seed)
+        self._a = np.array([rng.randrange(1, _MAX_A) for _ in range(num_perm)], dtype=np.uint64)[:, None]
+        self._b = np.array([rng.randrange(0, _PRIME) for _ in range(num_perm)], dtype=np.uint64)[:, None]
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+        self._parent = {}
+
+    def new_empty(self):
+        """同じ設定（署名の互換性がある）空のインデックスを作成します。"""
+        return NearDuplicateIndex(self.threshold, self.num_perm, self.bands,
+                                  self.shingle_size, self.max_bucket_size, self.seed)
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key):
+        return key in self._signatures
+
+    def signature(self, text):
+        """
+        日記のMinHash署名を計算します
+
+        Args:
+            text: 日記
+
+        Returns:
+            numpy.ndarray: 長さnum_permの32bit整数の配列
+        """
+        hashes = shingles(text, self.shingle_size)
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+        # (num_perm, シングル数) の行列でまとめて計算し、行ごとの最小値を署名とする
+        minimums = ((self._a * values + self._b) % _PRIME).min(axis=1)
+        return (minimums & _MAX_HASH).astype(np.uint32)
+
+    def similarity(self, signature_a, signature_b):
+        """2つの署名から推定Jaccard係数を計算します。"""
+        return int(np.count_nonzero(signature_a == signature_b)) / self.num_perm
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, text=None, signature=None):
+        """
+        登録済みの日記から類似するものを検索します（登録はしません）
+
+        Args:
+            text: 日記
+            signature: 計算済みの署名（指定時はtextを使わない）
+
+        Returns:
+            list: (キー, 推定Jaccard係数) のリスト（類似度の高い順）
+        """
+        if signature is None:
+            signature = self.signature(text)
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        matches = []
+        for key in candidates:
+            score = self.similarity(signature, self._signatures[key])
+            if score >= self.threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def add(self, key, text=None, signature=None):
+        """
+        日記を登録し、登録済みの類似日記を返します
+
+        Args:
+            key: 日記を識別するキー（行番号や日付など）
+            text: 日記
+            signature: 計算済みの署名（指定時はtextを使わない）
+
+        Returns:
+            list: (キー, 推定Jaccard係数) のリスト（類似度の高い順）
+        """
+        if signature is None:
+            signature = self.signature(text)
+        matches = self.query(signature=signature)
+
+        self._signatures[key] = signature
+        self._parent[key] = key
+        for other, _ in matches:
+            self._union(key, other)
+        for band, band_key in self._band_keys(signature):
+            bucket = self._buckets[band].setdefault(band_key, [])
+            if len(bucket) < self.max_bucket_size:
+                bucket.append(key)
+        return matches
+
+    def _find(self, key):
+        root = key
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # 経路圧縮
+        while self._parent[key] != root:
+            self._parent[key], key = root, self._parent[key]
+        return root
+
+    def _union(self, key_a, key_b):
+        root_a, root_b = self._find(key_a), self._find(key_b)
+        if root_a != root_b:
+            self._parent[root_a] = root_b
+
+    def clusters(self, min_size=2):
+        """
+        類似日記のクラスタを返します
+
+        Args:
+            min_size: 返すクラスタの最小件数
+
+        Returns:
+            list: キーのリストのリスト（各クラスタ内は登録順、クラスタは大きい順）
+        """
+        groups = {}
+        for key in self._signatures:
+            groups.setdefault(self._find(key), []).append(key)
+        result = [members for members in groups.values() if len(members) >= min_size]
+        result.sort(key=len, reverse=True)
+        return result
+
+    def signature_of(self, key):
+        """登録済みの日記の署名を返します。"""
+        return self._signatures[key]
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ステージ別プロファイリングモジュール
+各処理ステージ（CSV読み込み、未処理行の検出、API呼び出し、中間保存など）の
+所要時間を計測し、必要に応じてcProfile・tracemallocの結果も実行ディレクトリに出力します
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# レポートに表示する上位件数
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+
+
+class StageProfiler:
+    """
+    名前付きステージの計測を行うプロファイラ
+
+    無効な場合は stage() が何もしないため、本処理にはほぼ影響しません。
+    ステージは入れ子にでき、"親/子" 形式のパスごとに集計されます。
+    """
+
+    def __init__(self, enabled=False, run_dir=None, cpu=False, memory=False, name='run'):
+        """
+        Args:
+            enabled: 計測を有効にするかどうか
+            run_dir: レポートの出力先ディレクトリ
+            cpu: cProfileによる関数単位のプロファイルを取得するかどうか
+            memory: tracemallocによるメモリ計測を行うかどうか
+            name: 実行名（レポートの見出しとフレームグラフのルートに使用）
+        """
+        self.enabled = enabled
+        self.run_dir = run_dir
+        self.cpu = enabled and cpu
+        self.memory = enabled and memory
+        self.name = name
+        self.stats = {}
+        self._stack = []
+        self._cprofile = None
+        self._started_at = None
+        self._wall_seconds = 0.0
+
+    def start(self):
+        """計測を開始します。"""
+        if not self.enabled:
+            return
+        if self.memory:
+            tracemalloc.start()
+        if self.cpu:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._started_at = time.perf_counter()
+
+    def stop(self):
+        """計測を終了します。"""
+        if not self.enabled or self._started_at is None:
+            return
+        self._wall_seconds = time.perf_counter() - self._started_at
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        ステージの所要時間（とメモリ使用量）を計測するコンテキストマネージャ
+
+        Args:
+            name: ステージ名
+        """
+        if not self.enabled:
+            yield
+            return
+
+        path = '/'.join([frame['name'] for frame in self._stack] + [name])
+        frame = {'name': name, 'peak': 0}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # 親ステージのピークを確定させてから、このステージ用にリセット
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start_memory'] = current
+            frame['peak'] = current
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            entry = self.stats.setdefault(path, {
+                'calls': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'memory_delta': 0,
+                'memory_peak': 0,
+            })
+            entry['calls'] += 1
+            entry['seconds'] += elapsed
+            entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                frame['peak'] = max(frame['peak'], peak)
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], frame['peak'])
+                entry['memory_delta'] += current - frame['start_memory']
+                entry['memory_peak'] = max(entry['memory_peak'], frame['peak'])
+
+    def _self_seconds(self):
+        """子ステージの時間を除いた各ステージの自己時間を計算します。"""
+        self_seconds = {path: entry['seconds'] for path, entry in self.stats.items()}
+        for path, entry in self.stats.items():
+            parent = path.rpartition('/')[0]
+            if parent in self_seconds:
+                self_seconds[parent] -= entry['seconds']
+        return {path: max(seconds, 0.0) for path, seconds in self_seconds.items()}
+
+    def format_report(self):
+        """
+        ステージ別のレポート文字列を作成します
+
+        Returns:
+            str: レポート
+        """
+        lines = [
+            f"=== プロファイルレポート: {self.name} ===",
+            f"総実行時間: {self._wall_seconds:.3f} 秒",
+            '',
+            f"{'ステージ':<40} {'回数':>8} {'合計(秒)':>12} {'平均(ms)':>12} {'最大(ms)':>12} {'割合':>7}",
+        ]
+        for path, entry in sorted(self.stats.items()):
+            share = entry['seconds'] / self._wall_seconds * 100 if self._wall_seconds else 0.0
+            indent = '  ' * path.count('/')
+            label = indent + path.rpartition('/')[2]
+            lines.append(
+                f"{label:<40} {entry['calls']:>8} {entry['seconds']:>12.3f} "
+                f"{entry['seconds'] / entry['calls'] * 1000:>12.3f} "
+                f"{entry['max_seconds'] * 1000:>12.3f} {share:>6.1f}%"
+            )
+
+        if self.memory:
+            lines += ['', f"{'ステージ':<40} {'増減(KiB)':>14} {'ピーク(KiB)':>14}"]
+            for path, entry in sorted(self.stats.items()):
+                lines.append(
+                    f"{path:<40} {entry['memory_delta'] / 1024:>14.1f} {entry['memory_peak'] / 1024:>14.1f}"
+                )
+
+        if self._cprofile is not None:
+            buffer = io.StringIO()
+            stats = pstats.Stats(self._cprofile, stream=buffer)
+            stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            lines += ['', f"--- cProfile（累積時間の上位{TOP_FUNCTIONS}件） ---", buffer.getvalue().rstrip()]
+
+        return '\n'.join(lines)
+
+    def write_report(self):
+        """
+        レポートと各種プロファイルファイルを実行ディレクトリに出力します
+
+        出力ファイル:
+            report.txt: ステージ別レポート
+            stages.json: ステージ別の計測値
+            stages.folded: フレームグラフ用の折りたたみスタック（自己時間・マイクロ秒）
+            profile.prof: cProfileの結果（cpu有効時）
+            tracemalloc.snapshot: tracemallocのスナップショット（memory有効時）
+
+        Returns:
+            str: 出力先ディレクトリ（無効時はNone）
+        """
+        if not self.enabled:
+            return None
+
+        os.makedirs(self.run_dir, exist_ok=True)
+        report = self.format_report()
+
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(os.path.join(self.run_dir, 'tracemalloc.snapshot'))
+            top_lines = [f"--- メモリ確保元（上位{TOP_ALLOCATIONS}件） ---"]
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                top_lines.append(str(stat))
+            report += '\n\n' + '\n'.join(top_lines)
+            tracemalloc.stop()
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(os.path.join(self.run_dir, 'profile.prof'))
+
+        with open(os.path.join(self.run_dir, 'report.txt'), 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+
+        with open(os.path.join(self.run_dir, 'stages.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'name': self.name,
+                'wall_seconds': self._wall_seconds,
+                'stages': self.stats,
+            }, f, ensure_ascii=False, indent=2)
+
+        with open(os.path.join(self.run_dir, 'stages.folded'), 'w', encoding='utf-8') as f:
+            for path, seconds in sorted(self._self_seconds().items()):
+                stack = ';'.join([self.name] + path.split('/'))
+                f.write(f"{stack} {int(seconds * 1_000_000)}\n")
+
+        print(report)
+        print(f"\nプロファイル結果を出力しました: {self.run_dir}")
+        return self.run_dir
+
+
+def add_profile_arguments(parser):
+    """
+    プロファイリング用のコマンドライン引数を追加します
+
+    Args:
+        parser: argparse.ArgumentParser
+    """
+    group = parser.add_argument_group('プロファイリング')
+    group.add_argument('--profile', action='store_true',
+                       help='ステージ別の所要時間を計測してレポートを出力する')
+    group.add_argument('--profile-cpu', action='store_true',
+                       help='cProfileで関数単位のプロファイルも取得する（--profileを含む）')
+    group.add_argument('--profile-memory', action='store_true',
+                       help='tracemallocでメモリ使用量も計測する（--profileを含む）')
+    group.add_argument('--profile-dir', default=None,
+                       help='プロファイル結果の出力先（既定: <スクリプトの場所>/profiles/<実行名>-<日時>）')
+
+
+def create_profiler(args, base_dir, name):
+    """
+    コマンドライン引数からプロファイラを作成します
+
+    Args:
+        args: add_profile_argumentsを適用したパーサの解析結果
+        base_dir: 既定の出力先の基準ディレクトリ
+        name: 実行名
+
+    Returns:
+        StageProfiler: プロファイラ（--profile系の指定がなければ無効）
+    """
+    enabled = args.profile or args.profile_cpu or args.profile_memory
+    run_dir = args.profile_dir
+    if enabled and run_dir is None:
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        run_dir = os.path.join(base_dir, 'profiles', f"{name}-{timestamp}")
+    return StageProfiler(
+        enabled=enabled,
+        run_dir=run_dir,
+        cpu=args.profile_cpu,
+        memory=args.profile_memory,
+        name=name,
+    )
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+レート制限モジュール
+1分あたりのリクエスト数を守るため、呼び出し間隔を一定以上に保ちます
+複数スレッドから共有して使用できます
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """最小間隔方式のスレッドセーフなレート制限"""
+
+    def __init__(self, requests_per_minute):
+        """
+        Args:
+            requests_per_minute: 1分あたりの最大リクエスト数
+        """
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute は正の値を指定してください")
+        self.interval = 60 / requests_per_minute
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def reserve(self):
+        """
+        次のリクエスト枠を予約します（待機はしません）
+
+        Returns:
+            float: 予約した枠まで待つ必要のある秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.interval
+            return start - now
+
+    def pending_seconds(self):
+        """
+        現在の予約がすべて消化されるまでの秒数を返します
+
+        Returns:
+            float: 残り秒数
+        """
+        with self._lock:
+            return max(0.0, self._next_time - time.monotonic())
+
+    def acquire(self):
+        """
+        リクエスト枠が空くまで待機します
+
+        Returns:
+            float: 実際に待機した秒数
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -5,9 +5,12 @@ Flash Lite版日記生成スクリプト
 Gemini 2.5 Flash Liteを使用して日記生成を行います
 """
 
+import argparse
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from tqdm import tqdm
 import google.generativeai as genai
@@ -17,6 +20,11 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 sys.path.append(project_root)
 sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
 from env_loader import get_gemini_api_key, load_environment
+from continuity import TOKEN_BUDGET, ContinuityStore
+from latency_stats import summarize_latencies
+from near_duplicates import THRESHOLD, NearDuplicateIndex
+from profiler import StageProfiler, add_profile_arguments, create_profiler
+from rate_limiter import RateLimiter
 
 # --- スクリプト自身の場所を基準にファイルのパスを自動設定 ---
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -26,11 +34,24 @@ INPUT_CSV_FILE = os.path.join(script_dir, 'prompts.csv')
 OUTPUT_CSV_FILE = os.path.join(script_dir, 'results.csv')
 BACKUP_CSV_FILE = os.path.join(script_dir, 'backup.csv')
 
+# 複数モデル比較（--models）用の出力先
+FANOUT_CSV_FILE = os.path.join(script_dir, 'results_fanout.csv')
+FANOUT_BACKUP_CSV_FILE = os.path.join(script_dir, 'backup_fanout.csv')
+MODEL_STATS_CSV_FILE = os.path.join(script_dir, 'model_stats.csv')
+MODEL_REQUESTS_CSV_FILE = os.path.join(script_dir, 'model_requests.csv')
+RESULT_COLUMN_PREFIX = '生成結果_'
+
+# 類似日記の検出（--dedupe）用の出力先
+DUPLICATES_CSV_FILE = os.path.join(script_dir, 'duplicates.csv')
+
 # API設定
 MODEL_NAME = 'gemini-2.5-flash-lite'
 REQUESTS_PER_MINUTE = 15
 DELAY_SECONDS = 60 / REQUESTS_PER_MINUTE
 
+# 類似した日記を再生成するときのサンプリング設定（通常より多様な出力にする）
+RESAMPLE_GENERATION_CONFIG = {'temperature': 1.3, 'top_p': 0.98, 'top_k': 64}
+
 # --- ここからスクリプト本体 ---
 
 def configure_api():
@@ -48,23 +69,44 @@ def configure_api():
         print("環境変数ファイル(.env)にGEMINI_API_KEYが正しく設定されているか確認してください。")
         exit()
 
-def generate_diary_with_gemini(prompt, model):
+def generate_diary_with_gemini(prompt, model, continuity='', generation_config=None):
     """
     Gemini APIを使用して日記を生成します
     
     Args:
         prompt: 生成プロンプト
         model: Geminiモデルインスタンス
+        continuity: これまでの日記の記憶（ContinuityStore.render()の結果）
+        generation_config: サンプリング設定（省略時はモデルの既定値）
     
     Returns:
         str: 生成された日記
     """
+    result_text, _ = generate_diary_with_usage(prompt, model, continuity, generation_config)
+    return result_text
+
+def generate_diary_with_usage(prompt, model, continuity='', generation_config=None):
+    """
+    Gemini APIを使用して日記を生成し、トークン使用量も返します
+    
+    Args:
+        prompt: 生成プロンプト
+        model: Geminiモデルインスタンス
+        continuity: これまでの日記の記憶（ContinuityStore.render()の結果）
+        generation_config: サンプリング設定（省略時はモデルの既定値）
+    
+    Returns:
+        tuple: (生成された日記, トークン使用量の辞書。エラー時はNone)
+    """
     try:
+        # 前日までの記憶がある場合はプロンプトの前に差し込む
+        continuity_section = f"\n{continuity}\n" if continuity else ''
+        
         # 日記生成用のプロンプトを構築
         enhanced_prompt = f"""
 以下のプロンプトに基づいて、江戸川コナンの日記を生成してください。
 日記は自然で読みやすく、コナンの視点から書かれたものにしてください。
-
+{continuity_section}
 プロンプト: {prompt}
 
 要求事項:
@@ -77,30 +119,116 @@ def generate_diary_with_gemini(prompt, model):
 日記:
 """
         
-        response = model.generate_content(enhanced_prompt)
+        response = model.generate_content(enhanced_prompt, generation_config=generation_config)
         result_text = response.text.strip()
         
         # 日付を追加
         current_date = time.strftime("%Y年%m月%d日")
         result_text = f"{current_date}\n{result_text}"
         
-        return result_text
+        usage_metadata = getattr(response, 'usage_metadata', None)
+        usage = {
+            'prompt_tokens': getattr(usage_metadata, 'prompt_token_count', 0) or 0,
+            'output_tokens': getattr(usage_metadata, 'candidates_token_count', 0) or 0,
+        }
+        return result_text, usage
         
     except Exception as e:
-        return f"APIエラー: {e}"
+        return f"APIエラー: {e}", None
+
+def is_generated(result):
+    """生成結果が正常に生成された日記かどうかを判定します。"""
+    if pd.isna(result) or result == '':
+        return False
+    return not str(result).startswith(('APIエラー', 'エラー:'))
+
+def write_duplicate_report(df_output, duplicate_index, path=None):
+    """
+    類似日記のクラスタをCSVに出力します
+    
+    Args:
+        df_output: 結果のDataFrame
+        duplicate_index: 日記を登録済みのNearDuplicateIndex
+        path: 出力先（省略時はDUPLICATES_CSV_FILE）
+    
+    Returns:
+        list: クラスタ（行番号のリストのリスト）
+    """
+    path = path or DUPLICATES_CSV_FILE
+    clusters = duplicate_index.clusters()
+    rows = []
+    for cluster_id, members in enumerate(clusters, start=1):
+        first = duplicate_index.signature_of(members[0])
+        for index in members:
+            rows.append({
+                'クラスタ': cluster_id,
+                '行': index + 1,
+                '日付': df_output.loc[index, '日付'] if '日付' in df_output.columns else '',
+                '類似度': round(duplicate_index.similarity(first, duplicate_index.signature_of(index)), 3),
+                '冒頭': str(df_output.loc[index, '生成結果'])[:100],
+            })
+    pd.DataFrame(rows, columns=['クラスタ', '行', '日付', '類似度', '冒頭']).to_csv(path, index=False)
+    print(f"類似日記: {len(clusters)} クラスタ / {len(rows)} 件 ({path})")
+    return clusters
+
+def requeue_near_duplicates(df_output, duplicate_index):
+    """
+    生成済みの日記から類似日記のクラスタを検出し、各クラスタの最初の1件以外を再生成の対象にします
+    
+    残した日記はduplicate_indexに登録されます。対象の行の日記は再生成に成功するまで
+    df_outputに残すため、中断しても元の日記は失われません。再開時は残っている類似日記が
+    再び対象になります。
+    
+    Args:
+        df_output: 結果のDataFrame
+        duplicate_index: 残した日記を登録するNearDuplicateIndex
+    
+    Returns:
+        set: 再生成の対象にした行番号
+    """
+    existing_index = duplicate_index.new_empty()
+    for index, result in df_output['生成結果'].items():
+        if is_generated(result):
+            existing_index.add(index, result)
 
-def process_prompts():
-    """CSVファイルを読み込み、プロンプトを処理して結果を保存します。"""
+    clusters = write_duplicate_report(df_output, existing_index)
+    requeued = {index for members in clusters for index in members[1:]}
+    for index, result in df_output['生成結果'].items():
+        if index not in requeued and is_generated(result):
+            duplicate_index.add(index, signature=existing_index.signature_of(index))
+    print(f"類似日記 {len(requeued)} 件を再生成の対象に戻しました。")
+    return requeued
+
+def process_prompts(profiler=None, continuity_store=None, duplicate_index=None, requeue_duplicates=False):
+    """
+    CSVファイルを読み込み、プロンプトを処理して結果を保存します
+    
+    continuity_storeを指定した場合は日付順に生成し、前日までの記憶を
+    各プロンプトに差し込みます。処理済みの日は再開時に記憶へ取り込み直します。
+    
+    duplicate_indexを指定した場合は、生成済みの日記と類似した日記が生成されたときに
+    サンプリング設定を変えて1回だけ再生成し、最後に類似日記のレポートを出力します。
+    
+    Args:
+        profiler: ステージ計測用のStageProfiler（省略時は計測しない）
+        continuity_store: 日記の記憶を保持するContinuityStore（省略時は記憶を使わない）
+        duplicate_index: 類似日記の検出に使うNearDuplicateIndex（省略時は検出しない）
+        requeue_duplicates: 生成済みの類似日記を未処理に戻して再生成するかどうか
+    """
+    if profiler is None:
+        profiler = StageProfiler()
     
     try:
         # 出力ファイルが存在する場合は読み込み
         if os.path.exists(OUTPUT_CSV_FILE):
-            df_output = pd.read_csv(OUTPUT_CSV_FILE)
+            with profiler.stage('load_csv'):
+                df_output = pd.read_csv(OUTPUT_CSV_FILE)
             print(f"'{OUTPUT_CSV_FILE}' を読み込みました。続きから処理を再開します。")
         else:
             # 入力ファイルから新規作成
             if os.path.exists(INPUT_CSV_FILE):
-                df_input = pd.read_csv(INPUT_CSV_FILE)
+                with profiler.stage('load_csv'):
+                    df_input = pd.read_csv(INPUT_CSV_FILE)
                 df_input['生成結果'] = ''
                 df_output = df_input
                 print(f"入力ファイル '{INPUT_CSV_FILE}' を基に、'{OUTPUT_CSV_FILE}' を新規作成します。")
@@ -109,18 +237,52 @@ def process_prompts():
                 print(f"スクリプトが探しているパス: {INPUT_CSV_FILE}")
                 return
 
+        # 類似日記の検出を行う場合は、生成済みの日記をインデックスに登録する
+        resample_rows = set()
+        if duplicate_index is not None:
+            with profiler.stage('dedupe_index'):
+                df_output['生成結果'] = df_output['生成結果'].astype(object)
+                if requeue_duplicates:
+                    resample_rows = requeue_near_duplicates(df_output, duplicate_index)
+                else:
+                    for index, result in df_output['生成結果'].items():
+                        if is_generated(result):
+                            duplicate_index.add(index, result)
+
         # 未処理のプロンプトを特定
-        rows_to_process = [index for index, row in df_output.iterrows() 
-                          if pd.isna(row.get('生成結果', float('nan'))) or row.get('生成結果', '') == '']
+        with profiler.stage('detect_pending'):
+            rows_to_process = [index for index, row in df_output.iterrows() 
+                              if index in resample_rows
+                              or pd.isna(row.get('生成結果', float('nan'))) or row.get('生成結果', '') == '']
 
         if not rows_to_process:
             print("すべてのプロンプトが処理済みです。")
+            if duplicate_index is not None:
+                write_duplicate_report(df_output, duplicate_index)
             return
 
         print(f"未処理のプロンプトが {len(rows_to_process)} 件見つかりました。処理を開始します。")
 
+        # 記憶を使う場合は日付順に処理し、処理済みの日を日付順に取り込めるようにする
+        completed_rows = []
+        if continuity_store is not None:
+            with profiler.stage('continuity_order'):
+                if '日付' in df_output.columns:
+                    dates = df_output['日付'].astype(str)
+                else:
+                    # 日付列がない場合は行番号（整数）の順に処理する
+                    dates = pd.Series(df_output.index, index=df_output.index)
+                rows_to_process.sort(key=lambda index: (dates[index], index))
+                pending = set(rows_to_process)
+                completed_rows = sorted(
+                    (index for index in df_output.index
+                     if index not in pending and is_generated(df_output.loc[index, '生成結果'])),
+                    key=lambda index: (dates[index], index))
+        replayed = 0
+
         # 処理前のバックアップを作成
-        df_output.to_csv(BACKUP_CSV_FILE, index=False)
+        with profiler.stage('backup'):
+            df_output.to_csv(BACKUP_CSV_FILE, index=False)
         print(f"バックアップを作成しました: {BACKUP_CSV_FILE}")
 
         # Geminiモデルを初期化
@@ -134,10 +296,47 @@ def process_prompts():
                 df_output.loc[index, '生成結果'] = "エラー: プロンプトが空です"
                 continue
 
+            continuity = ''
+            if continuity_store is not None:
+                with profiler.stage('continuity'):
+                    # この日より前に処理済みの日を記憶に取り込む
+                    while replayed < len(completed_rows) and dates[completed_rows[replayed]] < dates[index]:
+                        done = completed_rows[replayed]
+                        continuity_store.update(dates[done], str(df_output.loc[done, '生成プロンプト']),
+                                                df_output.loc[done, '生成結果'])
+                        replayed += 1
+                    continuity = continuity_store.render()
+
             try:
-                # Gemini APIを使用して日記を生成
-                result_text = generate_diary_with_gemini(prompt, model)
+                # Gemini APIを使用して日記を生成（類似日記として戻した行はサンプリング設定を変える）
+                generation_config = RESAMPLE_GENERATION_CONFIG if index in resample_rows else None
+                with profiler.stage('api_call'):
+                    result_text = generate_diary_with_gemini(prompt, model, continuity, generation_config)
+                
+                if duplicate_index is not None and is_generated(result_text):
+                    with profiler.stage('dedupe'):
+                        signature = duplicate_index.signature(result_text)
+                        matches = duplicate_index.query(signature=signature)
+                    if matches and generation_config is None:
+                        similar_index, score = matches[0]
+                        print(f"\n行 {index + 1}: 行 {similar_index + 1} と類似（{score:.2f}）のため、設定を変えて再生成します")
+                        with profiler.stage('rate_limit_wait'):
+                            time.sleep(DELAY_SECONDS)
+                        with profiler.stage('api_call'):
+                            retry_text = generate_diary_with_gemini(prompt, model, continuity, RESAMPLE_GENERATION_CONFIG)
+                        if is_generated(retry_text):
+                            result_text = retry_text
+                            signature = duplicate_index.signature(result_text)
+                    duplicate_index.add(index, signature=signature)
+                
+                # 類似日記として再生成する行は、失敗したら元の日記を残す
+                if index in resample_rows and not is_generated(result_text):
+                    print(f"\n行 {index + 1}: 再生成に失敗したため、元の日記を残します")
+                    result_text = df_output.loc[index, '生成結果']
+                
                 df_output.loc[index, '生成結果'] = result_text
+                if continuity_store is not None and is_generated(result_text):
+                    continuity_store.update(dates[index], prompt, result_text)
                 
                 # 進捗を表示
                 print(f"\n行 {index + 1}: 生成完了")
@@ -145,20 +344,25 @@ def process_prompts():
                 print(f"結果: {result_text[:100]}...")
                 
             except Exception as e:
-                result_text = f"APIエラー: {e}"
-                df_output.loc[index, '生成結果'] = result_text
+                if index not in resample_rows:
+                    df_output.loc[index, '生成結果'] = f"APIエラー: {e}"
                 print(f"\n行 {index + 1} でエラーが発生しました: {e}")
 
             # 定期的に保存
             if (index + 1) % 5 == 0:
-                df_output.to_csv(OUTPUT_CSV_FILE, index=False)
+                with profiler.stage('checkpoint'):
+                    df_output.to_csv(OUTPUT_CSV_FILE, index=False)
                 print(f"中間保存完了: {index + 1}件処理済み")
             
             # API制限に従って遅延
-            time.sleep(DELAY_SECONDS)
+            with profiler.stage('rate_limit_wait'):
+                time.sleep(DELAY_SECONDS)
 
         # 最終保存
-        df_output.to_csv(OUTPUT_CSV_FILE, index=False)
+        with profiler.stage('final_save'):
+            df_output.to_csv(OUTPUT_CSV_FILE, index=False)
+            if duplicate_index is not None:
+                write_duplicate_report(df_output, duplicate_index)
         print("\nすべての処理が完了しました。")
 
     except Exception as e:
@@ -173,18 +377,289 @@ def process_prompts():
             except Exception as restore_error:
                 print(f"復旧に失敗しました: {restore_error}")
 
+def result_column(model_name):
+    """モデルごとの結果列名を返します。"""
+    return f"{RESULT_COLUMN_PREFIX}{model_name}"
+
+def summarize_model_stats(model_name, records):
+    """
+    1モデル分のリクエスト記録を集計します
+    
+    Args:
+        model_name: モデル名
+        records: (レイテンシ秒, トークン使用量またはNone) のリスト
+    
+    Returns:
+        dict: 集計結果
+    """
+    latency = summarize_latencies(latency for latency, _ in records)
+    usages = [usage for _, usage in records if usage is not None]
+
+    return {
+        'モデル': model_name,
+        'リクエスト数': len(records),
+        'エラー数': len(records) - len(usages),
+        '平均レイテンシ(秒)': latency['mean'],
+        'p50レイテンシ(秒)': latency['p50'],
+        'p95レイテンシ(秒)': latency['p95'],
+        '最大レイテンシ(秒)': latency['max'],
+        '入力トークン合計': sum(usage['prompt_tokens'] for usage in usages),
+        '出力トークン合計': sum(usage['output_tokens'] for usage in usages),
+    }
+
+def update_model_stats(model_names, records):
+    """
+    今回のリクエスト記録をリクエストログに追記し、ログ全体からモデル別統計を作成します
+    
+    再開した場合も、統計には以前の実行のリクエストが含まれます。
+    
+    Args:
+        model_names: 統計を作成するモデル名のリスト
+        records: {モデル名: (レイテンシ秒, トークン使用量またはNone) のリスト}
+    
+    Returns:
+        DataFrame: モデル別統計
+    """
+    rows = [
+        {
+            'モデル': model_name,
+            'レイテンシ(秒)': latency,
+            '入力トークン': usage['prompt_tokens'] if usage is not None else None,
+            '出力トークン': usage['output_tokens'] if usage is not None else None,
+        }
+        for model_name in model_names for latency, usage in records[model_name]
+    ]
+    log_df = pd.DataFrame(rows, columns=['モデル', 'レイテンシ(秒)', '入力トークン', '出力トークン'])
+    if os.path.exists(MODEL_REQUESTS_CSV_FILE):
+        log_df = pd.concat([pd.read_csv(MODEL_REQUESTS_CSV_FILE), log_df], ignore_index=True)
+    log_df.to_csv(MODEL_REQUESTS_CSV_FILE, index=False)
+
+    all_records = {model_name: [] for model_name in model_names}
+    for row in log_df.itertuples(index=False):
+        if row[0] in all_records:
+            usage = None if pd.isna(row[2]) else {'prompt_tokens': int(row[2]), 'output_tokens': int(row[3])}
+            all_records[row[0]].append((float(row[1]), usage))
+    stats_df = pd.DataFrame([
+        summarize_model_stats(model_name, all_records[model_name]) for model_name in model_names
+    ])
+    stats_df.to_csv(MODEL_STATS_CSV_FILE, index=False)
+    return stats_df
+
+def process_prompts_fanout(model_names, requests_per_minute=REQUESTS_PER_MINUTE, profiler=None):
+    """
+    各プロンプトを複数モデルへ同時に送信し、モデルごとの結果列に保存します
+    
+    モデルごとに専用のワーカースレッドとレート制限を持つため、
+    N個のモデルの比較を1回の実行で行えます。
+    
+    Args:
+        model_names: 比較するモデル名のリスト
+        requests_per_minute: モデルごとの1分あたりの最大リクエスト数
+        profiler: ステージ計測用のStageProfiler（省略時は計測しない）
+    """
+    if profiler is None:
+        profiler = StageProfiler()
+    # 同じモデルが重複して指定された場合は1つにまとめる（順序は維持）
+    model_names = list(dict.fromkeys(model_names))
+    
+    try:
+        # 出力ファイルが存在する場合は読み込み
+        if os.path.exists(FANOUT_CSV_FILE):
+            with profiler.stage('load_csv'):
+                df_output = pd.read_csv(FANOUT_CSV_FILE)
+            print(f"'{FANOUT_CSV_FILE}' を読み込みました。続きから処理を再開します。")
+        elif os.path.exists(INPUT_CSV_FILE):
+            with profiler.stage('load_csv'):
+                df_output = pd.read_csv(INPUT_CSV_FILE)
+            print(f"入力ファイル '{INPUT_CSV_FILE}' を基に、'{FANOUT_CSV_FILE}' を新規作成します。")
+        else:
+            print(f"エラー: 入力ファイル '{INPUT_CSV_FILE}' が見つかりません。")
+            print(f"スクリプトが探しているパス: {INPUT_CSV_FILE}")
+            return
+
+        # モデルごとの未処理行を特定
+        pending = {}
+        with profiler.stage('detect_pending'):
+            for model_name in model_names:
+                column = result_column(model_name)
+                if column not in df_output.columns:
+                    df_output[column] = ''
+                df_output[column] = df_output[column].astype(object)
+                is_pending = df_output[column].isna() | (df_output[column] == '')
+                pending[model_name] = df_output.index[is_pending].tolist()
+
+        total = sum(len(rows) for rows in pending.values())
+        if total == 0:
+            print("すべてのモデルでプロンプトが処理済みです。")
+            return
+
+        for model_name in model_names:
+            print(f"{model_name}: 未処理 {len(pending[model_name])} 件")
+
+        # 処理前のバックアップを作成
+        with profiler.stage('backup'):
+            df_output.to_csv(FANOUT_BACKUP_CSV_FILE, index=False)
+        print(f"バックアップを作成しました: {FANOUT_BACKUP_CSV_FILE}")
+
+        # ワーカーはdf_outputを読まずにこの辞書からプロンプトを取得する（df_outputへの操作はlock内のみ）
+        prompts = df_output['生成プロンプト'].to_dict()
+        lock = threading.Lock()
+        progress = tqdm(total=total, desc="日記を生成中（複数モデル）")
+        records = {model_name: [] for model_name in model_names}
+        errors = {}
+        completed = [0]
+
+        def run_model(model_name):
+            """1モデル分の未処理行を、そのモデル専用のレート制限で順に処理します。"""
+            try:
+                model = genai.GenerativeModel(model_name)
+                limiter = RateLimiter(requests_per_minute)
+                column = result_column(model_name)
+
+                for index in pending[model_name]:
+                    prompt = prompts[index]
+                    if pd.isna(prompt):
+                        result_text, latency, usage = "エラー: プロンプトが空です", 0.0, None
+                    else:
+                        limiter.acquire()
+                        started = time.perf_counter()
+                        result_text, usage = generate_diary_with_usage(prompt, model)
+                        latency = time.perf_counter() - started
+                        records[model_name].append((latency, usage))
+
+                    with lock:
+                        df_output.loc[index, column] = result_text
+                        completed[0] += 1
+                        progress.update(1)
+                        # 定期的に保存
+                        if completed[0] % 5 == 0:
+                            df_output.to_csv(FANOUT_CSV_FILE, index=False)
+            except Exception as e:
+                # 他のモデルの処理と結果はそのまま続ける
+                with lock:
+                    errors[model_name] = e
+                print(f"\n{model_name} でエラーが発生したため、このモデルの処理を中止しました: {e}")
+
+        with profiler.stage('fanout'):
+            with ThreadPoolExecutor(max_workers=len(model_names)) as executor:
+                for model_name in model_names:
+                    executor.submit(run_model, model_name)
+        progress.close()
+
+        # 最終保存
+        with profiler.stage('final_save'):
+            df_output.to_csv(FANOUT_CSV_FILE, index=False)
+            stats_df = update_model_stats(model_names, records)
+
+        print("\n=== モデル別統計 ===")
+        print(stats_df.to_string(index=False))
+        print(f"\n結果: {FANOUT_CSV_FILE}")
+        print(f"統計: {MODEL_STATS_CSV_FILE}")
+        if errors:
+            for model_name, error in errors.items():
+                print(f"エラーで中止したモデル: {model_name}（{error}）")
+            print("中止したモデルの未処理分は、再実行すると続きから処理されます。")
+        else:
+            print("すべての処理が完了しました。")
+
+    except Exception as e:
+        print(f"処理中にエラーが発生しました: {e}")
+        # エラーが発生した場合はバックアップから復旧を試行
+        if os.path.exists(FANOUT_BACKUP_CSV_FILE):
+            print("バックアップからの復旧を試行します...")
+            try:
+                df_backup = pd.read_csv(FANOUT_BACKUP_CSV_FILE)
+                df_backup.to_csv(FANOUT_CSV_FILE, index=False)
+                print("バックアップから復旧しました。")
+            except Exception as restore_error:
+                print(f"復旧に失敗しました: {restore_error}")
+
+def parse_arguments(argv=None):
+    """
+    コマンドライン引数を解析します
+    
+    Args:
+        argv: 引数のリスト（省略時はsys.argv）
+    
+    Returns:
+        argparse.Namespace: 解析結果（modelsは重複を除いたモデル名のリスト）
+    """
+    parser = argparse.ArgumentParser(description='Gemini 2.5 Flash Liteで日記を一括生成します')
+    parser.add_argument('--models', default=None,
+                        help='カンマ区切りのモデル名。指定すると各プロンプトを全モデルへ同時に送信し、'
+                             'モデルごとの列に保存する（例: gemini-2.5-flash-lite,gemini-2.5-flash）')
+    parser.add_argument('--continuity', action='store_true',
+                        help='日付順に生成し、前日までの日記の記憶（要約・人物・因縁）をプロンプトに差し込む')
+    parser.add_argument('--continuity-budget', type=int, default=None,
+                        help=f'差し込む記憶のトークン数の上限（既定: {TOKEN_BUDGET}）')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='生成済みの日記と類似した日記が生成されたら設定を変えて再生成し、類似日記のレポートを出力する')
+    parser.add_argument('--requeue-duplicates', action='store_true',
+                        help='生成済みの類似日記を各クラスタ1件を残して未処理に戻し、設定を変えて再生成する（--dedupeを含む）')
+    parser.add_argument('--dedupe-threshold', type=float, default=None,
+                        help=f'類似とみなす推定Jaccard係数の下限（既定: {THRESHOLD}）')
+    parser.add_argument('--rpm', type=float, default=REQUESTS_PER_MINUTE,
+                        help=f'--models使用時のモデルごとの1分あたりの最大リクエスト数（既定: {REQUESTS_PER_MINUTE}）')
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # 同じモデルが重複して指定された場合は1つにまとめる（順序は維持）
+    args.models = list(dict.fromkeys(name.strip() for name in args.models.split(',') if name.strip())) if args.models else []
+    if args.models:
+        # --modelsでは記憶・類似日記の検出を使わないため、指定されたら無視せずにエラーにする
+        unsupported = [
+            option for option, value in [
+                ('--continuity', args.continuity),
+                ('--continuity-budget', args.continuity_budget is not None),
+                ('--dedupe', args.dedupe),
+                ('--requeue-duplicates', args.requeue_duplicates),
+                ('--dedupe-threshold', args.dedupe_threshold is not None),
+            ] if value
+        ]
+        if unsupported:
+            parser.error(f"--models と {', '.join(unsupported)} は同時に指定できません")
+    if args.rpm <= 0:
+        parser.error("--rpm には正の値を指定してください")
+    if args.continuity_budget is None:
+        args.continuity_budget = TOKEN_BUDGET
+    if args.dedupe_threshold is None:
+        args.dedupe_threshold = THRESHOLD
+    return args
+
 def main():
     """メイン処理"""
+    args = parse_arguments()
+    profiler = create_profiler(args, script_dir, 'flash_lite')
+    model_names = args.models
+
     print("=== Flash Lite版日記生成スクリプト ===")
-    print(f"使用モデル: {MODEL_NAME}")
-    print(f"API制限: {REQUESTS_PER_MINUTE} リクエスト/分")
+    if model_names:
+        print(f"比較モデル: {', '.join(model_names)}")
+        print(f"API制限: モデルごとに {args.rpm:g} リクエスト/分")
+        if args.profile_cpu:
+            print("注意: cProfileはメインスレッドのみを計測するため、ワーカースレッドのAPI呼び出しは含まれません")
+    else:
+        print(f"使用モデル: {MODEL_NAME}")
+        print(f"API制限: {REQUESTS_PER_MINUTE} リクエスト/分")
     print()
     
     # API設定
     configure_api()
     
     # プロンプト処理
-    process_prompts()
+    profiler.start()
+    try:
+        if model_names:
+            process_prompts_fanout(model_names, args.rpm, profiler)
+        else:
+            continuity_store = ContinuityStore(token_budget=args.continuity_budget) if args.continuity else None
+            duplicate_index = None
+            if args.dedupe or args.requeue_duplicates:
+                duplicate_index = NearDuplicateIndex(threshold=args.dedupe_threshold)
+            process_prompts(profiler, continuity_store, duplicate_index, args.requeue_duplicates)
+    finally:
+        profiler.stop()
+        profiler.write_report()
 
 if __name__ == "__main__":
     main()
@@ -5,6 +5,7 @@
 Gemini APIを使用せずにローカル環境で日記生成を行います
 """
 
+import argparse
 import os
 import sys
 import time
@@ -15,7 +16,9 @@ import random
 # プロジェクトルートのパスを追加して環境変数モジュールをインポート
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(project_root)
-from ai_requests.common.env_loader import load_environment, get_project_paths
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+from env_loader import load_environment, get_project_paths
+from profiler import StageProfiler, add_profile_arguments, create_profiler
 
 # --- スクリプト自身の場所を基準にファイルのパスを自動設定 ---
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -104,18 +107,27 @@ def generate_local_diary(prompt, episode_info=None):
     except Exception as e:
         return f"ローカル生成エラー: {e}"
 
-def process_prompts_local():
-    """CSVファイルを読み込み、プロンプトを処理して結果を保存します。"""
+def process_prompts_local(profiler=None):
+    """
+    CSVファイルを読み込み、プロンプトを処理して結果を保存します
+    
+    Args:
+        profiler: ステージ計測用のStageProfiler（省略時は計測しない）
+    """
+    if profiler is None:
+        profiler = StageProfiler()
     
     try:
         # 出力ファイルが存在する場合は読み込み
         if os.path.exists(OUTPUT_CSV_FILE):
-            df_output = pd.read_csv(OUTPUT_CSV_FILE)
+            with profiler.stage('load_csv'):
+                df_output = pd.read_csv(OUTPUT_CSV_FILE)
             print(f"'{OUTPUT_CSV_FILE}' を読み込みました。続きから処理を再開します。")
         else:
             # 入力ファイルから新規作成
             if os.path.exists(INPUT_CSV_FILE):
-                df_input = pd.read_csv(INPUT_CSV_FILE)
+                with profiler.stage('load_csv'):
+                    df_input = pd.read_csv(INPUT_CSV_FILE)
                 df_input['生成結果'] = ''
                 df_output = df_input
                 print(f"入力ファイル '{INPUT_CSV_FILE}' を基に、'{OUTPUT_CSV_FILE}' を新規作成します。")
@@ -125,8 +137,9 @@ def process_prompts_local():
                 return
 
         # 未処理のプロンプトを特定
-        rows_to_process = [index for index, row in df_output.iterrows() 
-                          if pd.isna(row.get('生成結果', float('nan'))) or row.get('生成結果', '') == '']
+        with profiler.stage('detect_pending'):
+            rows_to_process = [index for index, row in df_output.iterrows() 
+                              if pd.isna(row.get('生成結果', float('nan'))) or row.get('生成結果', '') == '']
 
         if not rows_to_process:
             print("すべてのプロンプトが処理済みです。")
@@ -135,7 +148,8 @@ def process_prompts_local():
         print(f"未処理のプロンプトが {len(rows_to_process)} 件見つかりました。処理を開始します。")
 
         # 処理前のバックアップを作成
-        df_output.to_csv(BACKUP_CSV_FILE, index=False)
+        with profiler.stage('backup'):
+            df_output.to_csv(BACKUP_CSV_FILE, index=False)
         print(f"バックアップを作成しました: {BACKUP_CSV_FILE}")
 
         # 各プロンプトを処理
@@ -155,7 +169,8 @@ def process_prompts_local():
                 }
 
             # ローカルで日記を生成
-            result_text = generate_local_diary(prompt, episode_info)
+            with profiler.stage('generate'):
+                result_text = generate_local_diary(prompt, episode_info)
             df_output.loc[index, '生成結果'] = result_text
             
             # 進捗を表示
@@ -163,14 +178,17 @@ def process_prompts_local():
             
             # 定期的に保存
             if (index + 1) % 10 == 0:
-                df_output.to_csv(OUTPUT_CSV_FILE, index=False)
+                with profiler.stage('checkpoint'):
+                    df_output.to_csv(OUTPUT_CSV_FILE, index=False)
                 print(f"中間保存完了: {index + 1}件処理済み")
             
             # ローカル処理なので短い遅延
-            time.sleep(DELAY_SECONDS)
+            with profiler.stage('rate_limit_wait'):
+                time.sleep(DELAY_SECONDS)
 
         # 最終保存
-        df_output.to_csv(OUTPUT_CSV_FILE, index=False)
+        with profiler.stage('final_save'):
+            df_output.to_csv(OUTPUT_CSV_FILE, index=False)
         print("\nすべての処理が完了しました。")
 
     except Exception as e:
@@ -186,9 +204,19 @@ def process_prompts_local():
                 print(f"復旧に失敗しました: {restore_error}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gemini APIを使用せずにローカル環境で日記を一括生成します')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = create_profiler(args, script_dir, 'local')
+
     print("=== ローカル版日記生成スクリプト ===")
     print("Gemini APIを使用せずにローカル環境で日記生成を行います。")
     print()
     
     load_environment_local()
-    process_prompts_local()
+    profiler.start()
+    try:
+        process_prompts_local(profiler)
+    finally:
+        profiler.stop()
+        profiler.write_report()
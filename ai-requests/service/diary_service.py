@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+オンデマンド日記生成サービス
+日付を指定したリクエストに対して、エピソード情報からプロンプトを作成し日記を生成して返す
+ローカルHTTPサービスです
+
+- 生成済みの日記はキャッシュから即座に返します
+- 同じ日付への同時リクエストは1回のAPI呼び出しにまとめます
+- API呼び出しは共有のレート制限を通して実行します
+- /metrics でレイテンシとキュー長などの統計を確認できます
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# プロジェクトルートのパスを追加して共通モジュールとプロンプト生成をインポート
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+sys.path.append(os.path.join(project_root, 'prompt-generator'))
+from latency_stats import summarize_latencies
+from rate_limiter import RateLimiter
+from create_prompts import generate_prompt_for_day, group_episodes_by_date, load_episodes
+
+# --- スクリプト自身の場所を基準にファイルのパスを自動設定 ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# --- 設定項目 ---
+EPISODES_CSV_FILE = os.path.join(project_root, 'prompt-generator', 'input-to-prompt-generator.csv')
+CACHE_CSV_FILE = os.path.join(script_dir, 'service_results.csv')
+
+HOST = '127.0.0.1'
+PORT = 8765
+REQUESTS_PER_MINUTE = 15
+MAX_WORKERS = 4
+REQUEST_TIMEOUT_SECONDS = 300
+LATENCY_WINDOW = 1000  # 統計に使う直近のリクエスト数
+CACHE_COLUMNS = ['日付', 'バックエンド', '生成プロンプト', '生成結果']
+
+# --- ここからスクリプト本体 ---
+
+
+class MockBackend:
+    """APIを呼び出さずに固定の日記を返すバックエンド（動作確認・テスト用）"""
+
+    def __init__(self, delay_seconds=0.5, jitter_seconds=0.0):
+        """
+        Args:
+            delay_seconds: 1回の生成にかかる疑似的な時間
+            jitter_seconds: 生成時間に加えるランダムな揺らぎの最大値
+        """
+        self.delay_seconds = delay_seconds
+        self.jitter_seconds = jitter_seconds
+        self.cache_key = 'mock'
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        """プロンプトに対する疑似的な日記を返します。"""
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay_seconds + random.uniform(0, self.jitter_seconds))
+        return f"（モック生成）プロンプト{len(prompt)}文字に基づく日記です。"
+
+
+class GeminiBackend:
+    """Flash Lite版のスクリプトと同じ方法でGemini APIを呼び出すバックエンド"""
+
+    def __init__(self, model_name=None):
+        """
+        Args:
+            model_name: 使用するモデル名（省略時はFlash Lite版の既定モデル）
+        """
+        # google-generativeaiはこのバックエンドを使う場合にのみ必要
+        sys.path.append(os.path.join(project_root, 'ai-requests', 'flash-lite'))
+        import google.generativeai as genai
+        from run_flash_lite_batch import MODEL_NAME, configure_api, generate_diary_with_gemini
+
+        configure_api()
+        self.cache_key = f"gemini:{model_name or MODEL_NAME}"
+        self._generate = generate_diary_with_gemini
+        self._model = genai.GenerativeModel(model_name or MODEL_NAME)
+
+    def generate(self, prompt):
+        """Gemini APIで日記を生成します。"""
+        result_text = self._generate(prompt, self._model)
+        if result_text.startswith('APIエラー:'):
+            raise RuntimeError(result_text)
+        return result_text
+
+
+def normalize_date(value):
+    """
+    日付文字列を 'YYYY/MM/DD' 形式にそろえます
+
+    Args:
+        value: 'YYYY/MM/DD' または 'YYYY-MM-DD' 形式の日付
+
+    Returns:
+        str: 'YYYY/MM/DD' 形式の日付
+
+    Raises:
+        ValueError: 日付として解釈できない場合
+    """
+    value = value.strip().replace('-', '/')
+    return datetime.strptime(value, '%Y/%m/%d').strftime('%Y/%m/%d')
+
+
+def cache_path_for_mode(path, intervals=False, label_days=False):
+    """
+    日付のまとめ方ごとに別のキャッシュCSVのパスを返します
+
+    まとめ方が変わるとプロンプトも変わるため、別のモードで生成した日記を再利用しないようにします。
+
+    Args:
+        path: 既定（発生日ごと）のキャッシュCSVのパス
+        intervals: 期間展開を行うかどうか
+        label_days: 日ごとの位置づけを付与するかどうか
+
+    Returns:
+        str: キャッシュCSVのパス
+    """
+    if not intervals:
+        return path
+    root, ext = os.path.splitext(path)
+    suffix = '_intervals_labeled' if label_days else '_intervals'
+    return f"{root}{suffix}{ext}"
+
+
+class DiaryService:
+    """
+    キャッシュ・リクエスト統合・レート制限付きの日記生成サービス本体
+
+    HTTPから独立しているため、MockBackendと組み合わせて直接テストできます。
+    """
+
+    def __init__(self, days, backend, rate_limiter, cache_path=None, max_workers=MAX_WORKERS):
+        """
+        Args:
+            days: {日付文字列: その日のエピソードのリスト} の辞書
+            backend: generate(prompt) とcache_key（バックエンド・モデルの識別子）を持つ生成バックエンド
+            rate_limiter: 全リクエストで共有するRateLimiter
+            cache_path: 生成結果を保存するCSVのパス（Noneの場合はメモリのみ）
+            max_workers: 同時に実行するAPI呼び出しの最大数
+        """
+        self.days = days
+        self.backend = backend
+        self.rate_limiter = rate_limiter
+        self.cache_path = cache_path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._inflight = {}
+        self._counters = {
+            'requests': 0,
+            'cache_hits': 0,
+            'coalesced': 0,
+            'upstream_calls': 0,
+            'upstream_errors': 0,
+            'not_found': 0,
+        }
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._active = 0
+        self._request_latencies = deque(maxlen=LATENCY_WINDOW)
+        self._upstream_latencies = deque(maxlen=LATENCY_WINDOW)
+
+        if cache_path:
+            self._load_cache(cache_path)
+
+    def _load_cache(self, path):
+        """
+        保存済みの生成結果をキャッシュに読み込みます
+
+        同じバックエンド・モデルで、現在のエピソードから作成したプロンプトと同じ
+        プロンプトで生成された日記だけを使用します。
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames
+            rows = list(reader) if fieldnames == CACHE_COLUMNS else []
+        if fieldnames != CACHE_COLUMNS:
+            # 生成元を確認できない古い形式のファイルは使わずに退避する
+            os.replace(path, f"{path}.old")
+            print(f"古い形式のキャッシュのため使用しません（{path}.old に退避しました）")
+            return
+
+        skipped = 0
+        for row in rows:
+            date_str = row['日付']
+            if (row['バックエンド'] == self.backend.cache_key and row['生成結果']
+                    and date_str in self.days
+                    and row['生成プロンプト'] == generate_prompt_for_day(date_str, self.days[date_str])):
+                self._cache[date_str] = row['生成結果']
+            else:
+                skipped += 1
+        print(f"キャッシュを読み込みました: {len(self._cache)}件（条件の異なる {skipped}件は除外） ({path})")
+
+    def _append_cache(self, date_str, prompt, diary):
+        """生成結果をキャッシュCSVに追記します（self._lockを保持した状態で呼び出す）。"""
+        is_new = not os.path.exists(self.cache_path)
+        with open(self.cache_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(CACHE_COLUMNS)
+            writer.writerow([date_str, self.backend.cache_key, prompt, diary])
+
+    def _generate(self, date_str):
+        """レート制限を通して1日分の日記を生成し、キャッシュに保存します。"""
+        dequeued = False
+        try:
+            prompt = generate_prompt_for_day(date_str, self.days[date_str])
+            self.rate_limiter.acquire()
+            with self._lock:
+                self._queue_depth -= 1
+                self._active += 1
+                self._counters['upstream_calls'] += 1
+            dequeued = True
+
+            started = time.perf_counter()
+            try:
+                diary = self.backend.generate(prompt)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._upstream_latencies.append(time.perf_counter() - started)
+
+            with self._lock:
+                self._cache[date_str] = diary
+                if self.cache_path:
+                    self._append_cache(date_str, prompt, diary)
+            return diary
+        except Exception:
+            with self._lock:
+                self._counters['upstream_errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                if not dequeued:
+                    self._queue_depth -= 1
+                self._inflight.pop(date_str, None)
+
+    def get_diary(self, date_str, timeout=REQUEST_TIMEOUT_SECONDS):
+        """
+        指定日の日記を返します（未生成の場合は生成します）
+
+        Args:
+            date_str: 'YYYY/MM/DD' 形式の日付
+            timeout: 生成を待つ最大秒数
+
+        Returns:
+            dict: {'date', 'diary', 'source'}。sourceは 'cache' / 'generated' / 'coalesced'
+
+        Raises:
+            KeyError: パラレルワールドとして扱える日付ではない場合
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._counters['requests'] += 1
+            # 現在のまとめ方で有効な日付かを先に確認し、無効になった日付はキャッシュがあっても返さない
+            if date_str not in self.days:
+                self._counters['not_found'] += 1
+                raise KeyError(date_str)
+            if date_str in self._cache:
+                self._counters['cache_hits'] += 1
+                self._request_latencies.append(time.perf_counter() - started)
+                return {'date': date_str, 'diary': self._cache[date_str], 'source': 'cache'}
+
+            future = self._inflight.get(date_str)
+            if future is None:
+                source = 'generated'
+                self._queue_depth += 1
+                self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+                future = self._executor.submit(self._generate, date_str)
+                self._inflight[date_str] = future
+            else:
+                source = 'coalesced'
+                self._counters['coalesced'] += 1
+
+        try:
+            diary = future.result(timeout=timeout)
+        finally:
+            with self._lock:
+                self._request_latencies.append(time.perf_counter() - started)
+        return {'date': date_str, 'diary': diary, 'source': source}
+
+    def metrics(self):
+        """
+        サービスの統計情報を返します
+
+        Returns:
+            dict: カウンタ、キュー長、レイテンシ統計
+        """
+        with self._lock:
+            return {
+                **self._counters,
+                'cached_days': len(self._cache),
+                'available_days': len(self.days),
+                'queue_depth': self._queue_depth,
+                'max_queue_depth': self._max_queue_depth,
+                'active_upstream': self._active,
+                'rate_limit_backlog_seconds': self.rate_limiter.pending_seconds(),
+                'request_latency_seconds': summarize_latencies(self._request_latencies),
+                'upstream_latency_seconds': summarize_latencies(self._upstream_latencies),
+            }
+
+    def shutdown(self):
+        """ワーカースレッドを停止します。"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_handler(service):
+    """サービスを参照するHTTPリクエストハンドラクラスを作成します。"""
+
+    class DiaryRequestHandler(BaseHTTPRequestHandler):
+        """GET /diary?date=YYYY/MM/DD, GET /diary/YYYY-MM-DD, GET /metrics を処理します。"""
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            # diary-viewer（ブラウザ）から直接呼び出せるようにする
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/metrics':
+                self._send_json(200, service.metrics())
+                return
+
+            if url.path == '/diary':
+                raw_date = parse_qs(url.query).get('date', [''])[0]
+            elif url.path.startswith('/diary/'):
+                raw_date = unquote(url.path[len('/diary/'):])
+            else:
+                self._send_json(404, {'error': f"不明なパスです: {url.path}"})
+                return
+
+            try:
+                date_str = normalize_date(raw_date)
+            except ValueError:
+                self._send_json(400, {'error': f"日付の形式が正しくありません: '{raw_date}'（例: 2023/07/15）"})
+                return
+
+            try:
+                self._send_json(200, service.get_diary(date_str))
+            except KeyError:
+                self._send_json(404, {'error': f"{date_str} はパラレルワールドとして扱える日付ではありません"})
+            except Exception as e:
+                self._send_json(502, {'error': f"日記の生成に失敗しました: {e}"})
+
+        def log_message(self, format, *args):
+            print(f"[{self.log_date_time_string()}] {format % args}")
+
+    return DiaryRequestHandler
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='日付を指定して日記をオンデマンド生成するローカルHTTPサービス')
+    parser.add_argument('--host', default=HOST, help=f'待ち受けアドレス（既定: {HOST}）')
+    parser.add_argument('--port', type=int, default=PORT, help=f'待ち受けポート（既定: {PORT}）')
+    parser.add_argument('--backend', choices=['gemini', 'mock'], default='gemini',
+                        help='生成バックエンド（mockはAPIを呼び出さない動作確認用）')
+    parser.add_argument('--model', default=None, help='geminiバックエンドで使用するモデル名')
+    parser.add_argument('--mock-delay', type=float, default=0.5, help='mockバックエンドの疑似生成時間（秒）')
+    parser.add_argument('--rpm', type=float, default=REQUESTS_PER_MINUTE,
+                        help=f'全リクエストで共有する1分あたりの最大API呼び出し数（既定: {REQUESTS_PER_MINUTE}）')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help=f'同時API呼び出し数（既定: {MAX_WORKERS}）')
+    parser.add_argument('--episodes', default=EPISODES_CSV_FILE, help='エピソード情報のCSV')
+    parser.add_argument('--cache-csv', default=None,
+                        help=f'生成結果を保存・再利用するCSV（既定: geminiは {CACHE_CSV_FILE}、mockは保存しない。'
+                             '--intervals・--label-days使用時はモードごとに別ファイル名になる）')
+    parser.add_argument('--intervals', action='store_true',
+                        help='複数日にわたる事件を期間として扱い、2件以上が進行中のすべての日付を生成対象にする')
+    parser.add_argument('--label-days', action='store_true',
+                        help='--intervals時に、各事件の発生日・継続日・解決日の位置づけをプロンプトに含める')
+    args = parser.parse_args()
+    if args.label_days and not args.intervals:
+        parser.error("--label-days は --intervals と併用してください")
+
+    print("=== オンデマンド日記生成サービス ===")
+    if not os.path.exists(args.episodes):
+        print(f"エラー: エピソードファイル '{args.episodes}' が見つかりません。")
+        return
+
+    days = dict(group_episodes_by_date(load_episodes(args.episodes), args.intervals, args.label_days))
+    print(f"生成可能な日付: {len(days)}日分")
+
+    if args.backend == 'mock':
+        backend = MockBackend(delay_seconds=args.mock_delay)
+    else:
+        backend = GeminiBackend(args.model)
+
+    # mockの結果を実際の日記として再利用しないよう、mockは明示した場合のみ保存する
+    cache_path = args.cache_csv
+    if cache_path is None and args.backend == 'gemini':
+        cache_path = CACHE_CSV_FILE
+    if cache_path:
+        cache_path = cache_path_for_mode(cache_path, args.intervals, args.label_days)
+
+    service = DiaryService(days, backend, RateLimiter(args.rpm), cache_path=cache_path, max_workers=args.workers)
+    server = ThreadingHTTPServer((args.host, args.port), create_handler(service))
+    print(f"http://{args.host}:{args.port}/diary?date=YYYY/MM/DD で待ち受けています（Ctrl+Cで終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nサービスを停止します。")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,14 @@
+import argparse
+import heapq
 import pandas as pd
 import os
+import sys
+from datetime import timedelta
+
+# 共通モジュール（プロファイラ）をインポート
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(script_dir), 'ai-requests', 'common'))
+from profiler import add_profile_arguments, create_profiler
 
 # --- 設定 ---
 INPUT_CSV = 'input-to-prompt-generator.csv'
@@ -17,6 +26,13 @@ COL_MAIN_CHARS = '主要登場人物'
 COL_CASE_TYPE = '事件種別'
 COL_PURPOSE = 'コナン一行の目的'
 COL_CRIMINAL = '犯人'
+
+# 期間展開（--label-days）時に各エピソードへ付与する、その日の位置づけ
+DAY_LABEL = '本日の位置づけ'
+LABEL_START = '発生日'
+LABEL_CONTINUATION = '継続日'
+LABEL_RESOLUTION = '解決日'
+LABEL_SINGLE_DAY = '発生・解決日'
 # --- 設定ここまで ---
 
 
@@ -27,14 +43,18 @@ def generate_prompt_for_day(date_str, episodes):
     parallel_worlds_content = ''
     for index, ep in enumerate(episodes):
         world_letter = chr(ord('A') + index)
+        # 期間展開時は、その日が事件の何日目にあたるかを添える
+        day_label_line = f"\n        - {DAY_LABEL}: {ep[DAY_LABEL]}" if ep.get(DAY_LABEL) else ''
+        # 終了日が空の場合は事件の日数から補った期間の終了日を表示する
+        start, end = episode_interval(ep)
         parallel_worlds_content += f"""
     - パラレルワールド{world_letter}:
         - シーズン: {ep[COL_SEASON]}
         - エピソードナンバー: {ep[COL_EPISODE_NUM]}
         - エピソードタイトル: {ep[COL_TITLE]}
-        - 事件の発生日: {date_str}
-        - 事件の終了日: {pd.to_datetime(ep[COL_END_DATE]).strftime('%Y/%m/%d')}
-        - 事件の日数: {ep[COL_DAYS]}
+        - 事件の発生日: {start.strftime('%Y/%m/%d')}
+        - 事件の終了日: {end.strftime('%Y/%m/%d')}
+        - 事件の日数: {ep[COL_DAYS]}{day_label_line}
         - 事件の概要: {ep[COL_SUMMARY]}
         - 主要登場人物: {ep[COL_MAIN_CHARS]}
         - 事件種別: {ep[COL_CASE_TYPE]}
@@ -109,10 +129,127 @@ def generate_prompt_for_day(date_str, episodes):
     return prompt_template.replace('{{', '{').replace('}}', '}')
 
 
-def main():
-    """メイン処理を実行します。"""
-    print(f"--- プロンプト生成スクリプト開始 ---")
-    
+def load_episodes(path):
+    """エピソード情報のCSVを、発生日・終了日を日付として解釈して読み込みます。"""
+    return pd.read_csv(path, parse_dates=[COL_DATE, COL_END_DATE])
+
+
+def episode_interval(ep):
+    """
+    エピソードが進行している期間（発生日～終了日）を返します。
+
+    終了日が空の場合は事件の日数から、それも無い場合は発生日のみの1日とみなします。
+
+    Returns:
+        tuple: (開始日, 終了日) の datetime.date。発生日が空の場合は None
+    """
+    if pd.isna(ep[COL_DATE]):
+        return None
+    start = pd.Timestamp(ep[COL_DATE]).date()
+    end = ep.get(COL_END_DATE)
+    if not pd.isna(end):
+        end = pd.Timestamp(end).date()
+    else:
+        days = pd.to_numeric(ep.get(COL_DAYS), errors='coerce')
+        end = start + timedelta(days=int(days) - 1) if not pd.isna(days) and days >= 1 else start
+    return start, max(start, end)
+
+
+def day_label(day, start, end):
+    """エピソードの期間の中で、その日が発生日・継続日・解決日のどれにあたるかを返します。"""
+    if start == end:
+        return LABEL_SINGLE_DAY
+    if day == start:
+        return LABEL_START
+    if day == end:
+        return LABEL_RESOLUTION
+    return f"{LABEL_CONTINUATION}（{(day - start).days + 1}日目/{(end - start).days + 1}日間）"
+
+
+def expand_episode_intervals(episodes, label_days=False):
+    """
+    各エピソードを期間として扱い、2つ以上の事件が同時に進行している日付をすべて返します。
+
+    発生日順に並べたエピソードを日付方向に走査（スイープライン）し、進行中の事件を
+    終了日のヒープで管理します。同時進行が2件未満の区間は次の発生日まで読み飛ばすため、
+    計算量は O((n + d) log n)（n: エピソード数, d: 出力する日数）です。
+
+    Args:
+        episodes: エピソード辞書のリスト
+        label_days: 各エピソードにその日の位置づけ（DAY_LABEL）を付与するかどうか
+
+    Returns:
+        list: (日付文字列 'YYYY/MM/DD', その日に進行中のエピソード辞書のリスト) のリスト（日付順）
+    """
+    intervals = []
+    for order, ep in enumerate(episodes):
+        interval = episode_interval(ep)
+        if interval is not None:
+            intervals.append((interval[0], interval[1], order, ep))
+    intervals.sort(key=lambda item: (item[0], item[2]))
+
+    days = []
+    active = {}   # 進行中の事件（発生日順）
+    ending = []   # (終了日, 順番) のヒープ
+    i = 0
+    day = intervals[0][0] if intervals else None
+    while day is not None:
+        # 前日までに終了した事件を外し、この日に発生した事件を加える
+        while ending and ending[0][0] < day:
+            _, order = heapq.heappop(ending)
+            del active[order]
+        while i < len(intervals) and intervals[i][0] == day:
+            start, end, order, ep = intervals[i]
+            active[order] = (start, end, ep)
+            heapq.heappush(ending, (end, order))
+            i += 1
+
+        if len(active) >= 2:
+            if label_days:
+                day_episodes = [{**ep, DAY_LABEL: day_label(day, start, end)} for start, end, ep in active.values()]
+            else:
+                day_episodes = [ep for _, _, ep in active.values()]
+            days.append((day.strftime('%Y/%m/%d'), day_episodes))
+
+        # この日で終了する事件を外し、翌日も2件以上が進行中なら翌日へ、そうでなければ次の発生日まで読み飛ばす
+        while ending and ending[0][0] <= day:
+            _, order = heapq.heappop(ending)
+            del active[order]
+        if len(active) >= 2:
+            day = day + timedelta(days=1)
+        elif i < len(intervals):
+            day = intervals[i][0]
+        else:
+            day = None
+    return days
+
+
+def group_episodes_by_date(df, intervals=False, label_days=False):
+    """
+    エピソードを日付ごとにまとめ、パラレルワールドとして扱える日付だけを返します。
+
+    Args:
+        df: load_episodes() で読み込んだDataFrame
+        intervals: Trueの場合は発生日だけでなく、事件が進行中のすべての日付で同時進行を数える
+        label_days: intervals時に、各エピソードへその日の位置づけ（発生日・継続日・解決日）を付与する
+
+    Returns:
+        list: (日付文字列 'YYYY/MM/DD', その日のエピソード辞書のリスト) のリスト（日付順）
+    """
+    if intervals:
+        return expand_episode_intervals(df.to_dict('records'), label_days)
+
+    days = []
+    for date, group in df.groupby(df[COL_DATE].dt.date):
+        # グループ内のエピソードが2つ未満（パラレルワールドではない）場合はスキップ
+        if len(group) < 2:
+            continue
+        days.append((date.strftime('%Y/%m/%d'), group.to_dict('records')))
+    return days
+
+
+def build_prompts(profiler, intervals=False, label_days=False):
+    """CSVを読み込み、日付ごとのプロンプトCSVを作成します。"""
     # ① 元データのCSVを読み取る
     if not os.path.exists(INPUT_CSV):
         print(f"エラー: 入力ファイル '{INPUT_CSV}' が見つかりません。")
@@ -121,37 +258,58 @@ def main():
     print(f"'{INPUT_CSV}' を読み込んでいます...")
     try:
         # '事件の発生日'と'事件の終了日'列を日付として解釈するように指定
-        df = pd.read_csv(INPUT_CSV, parse_dates=[COL_DATE, COL_END_DATE])
+        with profiler.stage('read_csv'):
+            df = load_episodes(INPUT_CSV)
     except Exception as e:
         print(f"CSV読み込み中にエラーが発生しました: {e}")
         return
 
     # ② 日付ごとにエピソードをグループ化する
-    grouped = df.groupby(df[COL_DATE].dt.date)
+    with profiler.stage('groupby'):
+        days = group_episodes_by_date(df, intervals, label_days)
     
     output_data = []
     print("日付ごとにプロンプトを生成しています...")
 
-    for date, group in grouped:
-        # グループ内のエピソードが2つ未満（パラレルワールドではない）場合はスキップ
-        if len(group) < 2:
-            continue
-        
-        episodes = group.to_dict('records')
-        date_str = date.strftime('%Y/%m/%d')
-        prompt = generate_prompt_for_day(date_str, episodes)
-        output_data.append({'日付': date_str, '生成プロンプト': prompt})
+    with profiler.stage('render_prompts'):
+        for date_str, episodes in days:
+            with profiler.stage('generate_prompt_for_day'):
+                prompt = generate_prompt_for_day(date_str, episodes)
+            output_data.append({'日付': date_str, '生成プロンプト': prompt})
 
     if not output_data:
         print("警告: パラレルワールドとして扱える日付（同日に2つ以上のエピソード）がありませんでした。")
         return
 
     # ③ 情報を組み合わせた1日に対して1行のプロンプトCSVを作成する
-    output_df = pd.DataFrame(output_data)
-    output_df.to_csv(OUTPUT_CSV, index=False)
+    with profiler.stage('write_csv'):
+        output_df = pd.DataFrame(output_data)
+        output_df.to_csv(OUTPUT_CSV, index=False)
     
     print(f"\n✅ 完了！")
     print(f"{len(output_df)}日分のプロンプトを '{OUTPUT_CSV}' に出力しました。")
+
+
+def main():
+    """メイン処理を実行します。"""
+    parser = argparse.ArgumentParser(description='エピソード情報から日記生成用のプロンプトCSVを作成します')
+    parser.add_argument('--intervals', action='store_true',
+                        help='複数日にわたる事件を発生日～終了日の期間として扱い、2件以上が進行中のすべての日付でプロンプトを作成する')
+    parser.add_argument('--label-days', action='store_true',
+                        help='--intervals時に、各事件がその日に発生日・継続日・解決日のどれにあたるかをプロンプトに含める')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if args.label_days and not args.intervals:
+        parser.error("--label-days は --intervals と併用してください")
+    profiler = create_profiler(args, script_dir, 'create_prompts')
+
+    print(f"--- プロンプト生成スクリプト開始 ---")
+    profiler.start()
+    try:
+        build_prompts(profiler, args.intervals, args.label_days)
+    finally:
+        profiler.stop()
+        profiler.write_report()
     print(f"--- スクリプト終了 ---")
 
 
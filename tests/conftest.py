@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+テスト共通のフィクスチャ
+"""
+
+import pandas as pd
+import pytest
+
+
+def _make_episode(title, start, end=None, days=None):
+    """
+    generate_prompt_for_dayに渡せる最小限のエピソードを作成します
+
+    Args:
+        title: エピソードタイトル
+        start: 事件の発生日（Noneの場合はNaT）
+        end: 事件の終了日（Noneの場合はNaT）
+        days: 事件の日数（Noneの場合はNaN）
+
+    Returns:
+        dict: エピソード辞書
+    """
+    return {
+        'シーズン': 1,
+        'エピソードナンバー': 1,
+        'エピソードタイトル': title,
+        '事件の発生日': pd.Timestamp(start) if start is not None else pd.NaT,
+        '事件の終了日': pd.Timestamp(end) if end is not None else pd.NaT,
+        '事件の日数': days if days is not None else float('nan'),
+        '事件の概要': f"{title}の概要",
+        '主要登場人物': '江戸川コナン , 毛利蘭',
+        '事件種別': '殺人事件',
+        'コナン一行の目的': '日常',
+        '犯人': '犯人',
+    }
+
+
+@pytest.fixture
+def make_episode():
+    """エピソード辞書を作成する関数を返します。"""
+    return _make_episode
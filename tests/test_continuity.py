@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日記の連続性（記憶）管理のテスト
+"""
+
+import os
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+from continuity import ContinuityStore, estimate_tokens
+
+PROMPT = """- 本日体験するパラレルワールド群:
+    - パラレルワールドA:
+        - エピソードタイトル: 銀行強盗殺人事件
+        - 事件の概要: 銀行で強盗事件が起きた。
+        - 主要登場人物: 江戸川コナン , 毛利蘭
+    - パラレルワールドB:
+        - エピソードタイトル: トイレに隠した秘密
+        - 事件の概要: 黒ずくめの男たちの取引を目撃した。
+        - 主要登場人物: 江戸川コナン , 灰原哀
+"""
+
+
+def test_thread_is_credited_to_the_episode_that_matched():
+    store = ContinuityStore()
+    store.update('2023/11/03', PROMPT, '今日は二つの事件に遭遇した。')
+    entry = store.threads['黒ずくめの組織']
+    assert entry['last_title'] == 'トイレに隠した秘密'
+    assert '「トイレに隠した秘密」' in store.render()
+
+
+def test_rendered_memory_stays_within_budget():
+    store = ContinuityStore(token_budget=200)
+    for day in range(1, 60):
+        store.update(f"2023/01/{day % 28 + 1:02d}", PROMPT, '今日は朝から雨だった。' * 5)
+        assert estimate_tokens(store.render()) <= 200
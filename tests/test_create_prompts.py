@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+プロンプト作成（期間展開）のテスト
+"""
+
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'prompt-generator'))
+from create_prompts import expand_episode_intervals, generate_prompt_for_day
+
+
+def brute_force_expand(episodes):
+    """全エピソードの全日付を1日ずつ数え上げる素朴な期間展開。"""
+    per_day = {}
+    for ep in episodes:
+        start = ep['事件の発生日'].date()
+        end = max(start, ep['事件の終了日'].date())
+        day = start
+        while day <= end:
+            per_day.setdefault(day, []).append(ep['エピソードタイトル'])
+            day += timedelta(days=1)
+    return [(day.strftime('%Y/%m/%d'), titles) for day, titles in sorted(per_day.items()) if len(titles) >= 2]
+
+
+def test_sweep_line_matches_brute_force_expansion(make_episode):
+    rng = random.Random(0)
+    for _ in range(50):
+        episodes = []
+        for i in range(rng.randint(0, 12)):
+            start = date(2023, 1, 1) + timedelta(days=rng.randint(0, 40))
+            end = start + timedelta(days=rng.choice([0, 0, 1, 2, 5, 10]))
+            episodes.append(make_episode(f"E{i}", start, end))
+        # 同じ発生日の中では入力順になるよう、発生日順に並べ替えて比較する
+        expected = brute_force_expand(sorted(episodes, key=lambda ep: ep['事件の発生日']))
+        actual = [(day, [ep['エピソードタイトル'] for ep in eps]) for day, eps in expand_episode_intervals(episodes)]
+        assert actual == expected
+
+
+def test_episode_without_end_date_uses_number_of_days(make_episode):
+    episodes = [
+        make_episode('終了日なし', '2023-07-15', days=3),
+        make_episode('1日だけ', '2023-07-17', '2023-07-17'),
+    ]
+    days = expand_episode_intervals(episodes, label_days=True)
+    assert [day for day, _ in days] == ['2023/07/17']
+
+    prompt = generate_prompt_for_day(*days[0])
+    assert '事件の終了日: 2023/07/17' in prompt
+    assert '本日の位置づけ: 解決日' in prompt
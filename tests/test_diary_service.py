@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+オンデマンド日記生成サービスのテスト（MockBackend使用）
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'service'))
+from diary_service import DiaryService, MockBackend, cache_path_for_mode
+from rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def make_service(make_episode):
+    """MockBackendを使うDiaryServiceを作成する関数を返します。"""
+    def create(cache_path=None, days=None, cache_key='mock'):
+        if days is None:
+            days = {'2023/07/15': [make_episode('A', '2023-07-15', '2023-07-15', 1),
+                                   make_episode('B', '2023-07-15', '2023-07-15', 1)]}
+        backend = MockBackend(delay_seconds=0.2)
+        backend.cache_key = cache_key
+        service = DiaryService(days, backend, RateLimiter(6000), cache_path=cache_path)
+        return service, backend
+    return create
+
+
+def test_concurrent_requests_are_coalesced_into_one_upstream_call(make_service):
+    service, backend = make_service()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(service.get_diary('2023/07/15')))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    service.shutdown()
+
+    assert backend.calls == 1
+    assert len({result['diary'] for result in results}) == 1
+    assert sorted(result['source'] for result in results).count('generated') == 1
+    assert service.metrics()['coalesced'] == 7
+    assert service.metrics()['queue_depth'] == 0
+
+
+def test_generated_diary_is_served_from_cache_and_persisted(make_service, tmp_path):
+    cache_path = str(tmp_path / 'cache.csv')
+    service, backend = make_service(cache_path)
+    first = service.get_diary('2023/07/15')
+    second = service.get_diary('2023/07/15')
+    service.shutdown()
+    assert (first['source'], second['source']) == ('generated', 'cache')
+    assert backend.calls == 1
+
+    # 再起動後もキャッシュから返される
+    restarted, restarted_backend = make_service(cache_path)
+    assert restarted.get_diary('2023/07/15')['source'] == 'cache'
+    assert restarted_backend.calls == 0
+    restarted.shutdown()
+
+
+def test_cached_date_that_is_no_longer_valid_is_not_served(make_service, tmp_path):
+    cache_path = str(tmp_path / 'cache.csv')
+    service, _ = make_service(cache_path)
+    service.get_diary('2023/07/15')
+    service.shutdown()
+
+    restarted, _ = make_service(cache_path, days={})
+    with pytest.raises(KeyError):
+        restarted.get_diary('2023/07/15')
+    restarted.shutdown()
+
+
+def test_cache_from_another_backend_is_not_served(make_service, tmp_path):
+    cache_path = str(tmp_path / 'cache.csv')
+    service, _ = make_service(cache_path)
+    service.get_diary('2023/07/15')
+    service.shutdown()
+
+    gemini, gemini_backend = make_service(cache_path, cache_key='gemini:gemini-2.5-flash-lite')
+    assert gemini.get_diary('2023/07/15')['source'] == 'generated'
+    assert gemini_backend.calls == 1
+    gemini.shutdown()
+
+
+def test_cache_for_a_different_prompt_is_not_served(make_service, make_episode, tmp_path):
+    cache_path = str(tmp_path / 'cache.csv')
+    service, _ = make_service(cache_path)
+    service.get_diary('2023/07/15')
+    service.shutdown()
+
+    # 別のエピソードCSVでは同じ日付でもプロンプトが変わる
+    days = {'2023/07/15': [make_episode('C', '2023-07-15', '2023-07-15', 1),
+                           make_episode('D', '2023-07-15', '2023-07-15', 1)]}
+    restarted, restarted_backend = make_service(cache_path, days=days)
+    assert restarted.get_diary('2023/07/15')['source'] == 'generated'
+    assert restarted_backend.calls == 1
+    restarted.shutdown()
+
+
+def test_cache_file_differs_per_grouping_mode():
+    path = os.path.join('x', 'service_results.csv')
+    paths = {
+        cache_path_for_mode(path),
+        cache_path_for_mode(path, intervals=True),
+        cache_path_for_mode(path, intervals=True, label_days=True),
+    }
+    assert len(paths) == 3
+    assert cache_path_for_mode(path) == path
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+レイテンシ集計のテスト
+"""
+
+import os
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+from latency_stats import summarize_latencies
+
+
+def test_summary_of_latencies():
+    summary = summarize_latencies([float(value) for value in range(100, 0, -1)])
+    assert summary == {'count': 100, 'mean': 50.5, 'p50': 51.0, 'p95': 96.0, 'max': 100.0}
+
+
+def test_summary_of_no_latencies():
+    assert summarize_latencies([]) == {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
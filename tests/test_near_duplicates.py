@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+類似日記検出（NearDuplicateIndex）のテスト
+"""
+
+import os
+import random
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+from near_duplicates import NearDuplicateIndex
+
+CHARACTERS = 'あいうえおかきくけこさしすせそたちつてとなにぬねの事件推理探偵少年'
+
+
+def random_diary(rng, length=600):
+    return ''.join(rng.choice(CHARACTERS) for _ in range(length))
+
+
+def test_exact_and_near_repeats_are_clustered():
+    rng = random.Random(0)
+    base = random_diary(rng)
+    others = [random_diary(rng) for _ in range(5)]
+
+    index = NearDuplicateIndex()
+    index.add('original', "2023年07月15日\n" + base)
+    # 日付行と空白の違いだけの完全な繰り返し
+    assert [key for key, _ in index.add('exact', "2023年07月16日\n" + base.replace('事件', '事件 '))] == ['original']
+    # 末尾の数文字だけ異なるほぼ同じ日記
+    assert index.add('near', base[:-6] + random_diary(rng, 6))
+    for i, text in enumerate(others):
+        assert index.add(f"other{i}", text) == []
+
+    assert index.clusters() == [['original', 'exact', 'near']]
+    assert len(index) == 8
+
+
+def test_signature_is_deterministic_and_compatible_with_new_empty():
+    index = NearDuplicateIndex()
+    text = random_diary(random.Random(1))
+    signature = index.signature(text)
+    assert len(signature) == index.num_perm
+    assert (index.new_empty().signature(text) == signature).all()
+    assert index.similarity(signature, index.signature(text)) == 1.0
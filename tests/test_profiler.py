@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ステージ別プロファイラのテスト
+"""
+
+import json
+import os
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+from profiler import StageProfiler
+
+
+def make_entry(calls, seconds):
+    return {'calls': calls, 'seconds': seconds, 'max_seconds': seconds, 'memory_delta': 0, 'memory_peak': 0}
+
+
+def test_nested_stages_are_recorded_by_path():
+    profiler = StageProfiler(enabled=True)
+    for _ in range(2):
+        with profiler.stage('load'):
+            with profiler.stage('parse'):
+                pass
+    with profiler.stage('save'):
+        pass
+    assert sorted(profiler.stats) == ['load', 'load/parse', 'save']
+    assert profiler.stats['load/parse']['calls'] == 2
+    assert profiler.stats['load']['seconds'] >= profiler.stats['load/parse']['seconds']
+
+
+def test_self_seconds_subtract_child_stages():
+    profiler = StageProfiler(enabled=True)
+    profiler.stats = {
+        'run': make_entry(1, 3.0),
+        'run/api': make_entry(4, 1.0),
+        'run/api/retry': make_entry(1, 0.25),
+        'run/save': make_entry(1, 0.5),
+    }
+    assert profiler._self_seconds() == {'run': 1.5, 'run/api': 0.75, 'run/api/retry': 0.25, 'run/save': 0.5}
+
+
+def test_report_files_are_written(tmp_path):
+    profiler = StageProfiler(enabled=True, run_dir=str(tmp_path), name='batch')
+    profiler.stats = {'run': make_entry(1, 2.0), 'run/api': make_entry(2, 1.5)}
+
+    assert profiler.write_report() == str(tmp_path)
+    with open(tmp_path / 'stages.folded', encoding='utf-8') as f:
+        assert f.read().splitlines() == ['batch;run 500000', 'batch;run;api 1500000']
+    with open(tmp_path / 'stages.json', encoding='utf-8') as f:
+        data = json.load(f)
+    assert data['name'] == 'batch'
+    assert data['stages']['run/api']['calls'] == 2
+    assert (tmp_path / 'report.txt').exists()
+
+
+def test_memory_peak_is_recorded_per_stage(tmp_path):
+    profiler = StageProfiler(enabled=True, run_dir=str(tmp_path), memory=True)
+    profiler.start()
+    with profiler.stage('allocate'):
+        data = [bytes(1024) for _ in range(1000)]
+    del data
+    profiler.stop()
+    profiler.write_report()
+    assert profiler.stats['allocate']['memory_peak'] >= 1000 * 1024
+    assert (tmp_path / 'tracemalloc.snapshot').exists()
+
+
+def test_disabled_profiler_does_nothing(tmp_path):
+    profiler = StageProfiler(run_dir=str(tmp_path / 'profile'))
+    profiler.start()
+    with profiler.stage('load'):
+        pass
+    profiler.stop()
+    assert profiler.stats == {}
+    assert profiler.write_report() is None
+    assert not (tmp_path / 'profile').exists()
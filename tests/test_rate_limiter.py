@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+レート制限のテスト
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+from rate_limiter import RateLimiter
+
+
+def test_reservations_from_many_threads_are_spaced_by_the_interval():
+    limiter = RateLimiter(60)  # 1秒間隔
+    waits = []
+    lock = threading.Lock()
+
+    def reserve_many():
+        for _ in range(5):
+            wait = limiter.reserve()
+            with lock:
+                waits.append(wait)
+
+    threads = [threading.Thread(target=reserve_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 予約自体は待機しないため、20件の枠は0秒後から1秒ずつずれて並ぶ
+    for slot, wait in enumerate(sorted(waits)):
+        assert wait == pytest.approx(slot, abs=0.2)
+    assert limiter.pending_seconds() == pytest.approx(20, abs=0.2)
+
+
+def test_requests_per_minute_must_be_positive():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Flash Lite版日記生成スクリプトのテスト（APIは呼び出さずスタブのモデルを使用）
+"""
+
+import itertools
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('google.generativeai')
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'common'))
+sys.path.append(os.path.join(project_root, 'ai-requests', 'flash-lite'))
+import run_flash_lite_batch as batch
+from near_duplicates import NearDuplicateIndex
+
+CHARACTERS = 'あいうえおかきくけこさしすせそたちつてとなにぬねの事件推理探偵少年'
+# スタブが返す日記の乱数シード（テスト全体で重複しないようにする）
+SEEDS = itertools.count(1)
+
+
+class StubModel:
+    """generate_contentの呼び出しを記録し、毎回異なる日記を返すモデル"""
+
+    def __init__(self, name, calls, fail_on=None, error=KeyboardInterrupt):
+        self.name = name
+        self.calls = calls
+        self.fail_on = fail_on
+        self.error = error
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls.append(generation_config)
+        if self.fail_on is not None and len(self.calls) == self.fail_on:
+            raise self.error()
+        rng = random.Random(next(SEEDS))
+        text = ''.join(rng.choice(CHARACTERS) for _ in range(300))
+        usage = SimpleNamespace(prompt_token_count=len(prompt), candidates_token_count=len(text))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    """出力先を一時ディレクトリに向け、待機をなくします。"""
+    paths = {
+        'INPUT_CSV_FILE': tmp_path / 'prompts.csv',
+        'OUTPUT_CSV_FILE': tmp_path / 'results.csv',
+        'BACKUP_CSV_FILE': tmp_path / 'backup.csv',
+        'DUPLICATES_CSV_FILE': tmp_path / 'duplicates.csv',
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(batch, name, str(path))
+    monkeypatch.setattr(batch, 'DELAY_SECONDS', 0)
+    return paths
+
+
+def use_model(monkeypatch, calls, **kwargs):
+    monkeypatch.setattr(batch.genai, 'GenerativeModel', lambda name: StubModel(name, calls, **kwargs))
+
+
+def test_interrupted_requeue_keeps_original_diaries(files, monkeypatch):
+    original = ''.join(random.Random(0).choice(CHARACTERS) for _ in range(300))
+    pd.DataFrame({
+        '生成プロンプト': [f"プロンプト{i}" for i in range(8)],
+        '生成結果': [original] * 8,
+    }).to_csv(files['OUTPUT_CSV_FILE'], index=False)
+
+    # 7件を再生成の対象にし、6回目の呼び出しで中断（Ctrl+C）する
+    calls = []
+    use_model(monkeypatch, calls, fail_on=6)
+    with pytest.raises(KeyboardInterrupt):
+        batch.process_prompts(duplicate_index=NearDuplicateIndex(), requeue_duplicates=True)
+    interrupted = pd.read_csv(files['OUTPUT_CSV_FILE'])
+    assert interrupted['生成結果'].notna().all()
+    assert (interrupted['生成結果'].iloc[5:] == original).all()
+
+    # 再開しても元の日記はバックアップ・結果のどちらからも失われず、残りは変更した設定で再生成される
+    calls = []
+    use_model(monkeypatch, calls)
+    batch.process_prompts(duplicate_index=NearDuplicateIndex(), requeue_duplicates=True)
+    backup = pd.read_csv(files['BACKUP_CSV_FILE'])
+    assert backup['生成結果'].notna().all()
+    assert calls == [batch.RESAMPLE_GENERATION_CONFIG] * 3
+
+    result = pd.read_csv(files['OUTPUT_CSV_FILE'])
+    assert result['生成結果'].map(batch.is_generated).all()
+    assert result['生成結果'].iloc[0] == original
+    assert result['生成結果'].nunique() == 8
+
+
+def test_failed_regeneration_keeps_original_diary(files, monkeypatch):
+    original = ''.join(random.Random(0).choice(CHARACTERS) for _ in range(300))
+    pd.DataFrame({
+        '生成プロンプト': ['プロンプトA', 'プロンプトB'],
+        '生成結果': [original, original],
+    }).to_csv(files['OUTPUT_CSV_FILE'], index=False)
+
+    use_model(monkeypatch, [], fail_on=1, error=RuntimeError)
+    batch.process_prompts(duplicate_index=NearDuplicateIndex(), requeue_duplicates=True)
+    result = pd.read_csv(files['OUTPUT_CSV_FILE'])
+    assert (result['生成結果'] == original).all()
+
+
+@pytest.fixture
+def fanout_files(tmp_path, monkeypatch):
+    """複数モデル比較の出力先を一時ディレクトリに向けます。"""
+    paths = {
+        'INPUT_CSV_FILE': tmp_path / 'prompts.csv',
+        'FANOUT_CSV_FILE': tmp_path / 'results_fanout.csv',
+        'FANOUT_BACKUP_CSV_FILE': tmp_path / 'backup_fanout.csv',
+        'MODEL_STATS_CSV_FILE': tmp_path / 'model_stats.csv',
+        'MODEL_REQUESTS_CSV_FILE': tmp_path / 'model_requests.csv',
+    }
+    for name, path in paths.items():
+        monkeypatch.setattr(batch, name, str(path))
+    pd.DataFrame({'生成プロンプト': [f"プロンプト{i}" for i in range(3)]}).to_csv(paths['INPUT_CSV_FILE'], index=False)
+    return paths
+
+
+def test_summarize_model_stats_counts_errors_and_tokens():
+    records = [
+        (1.0, {'prompt_tokens': 10, 'output_tokens': 100}),
+        (3.0, None),
+        (2.0, {'prompt_tokens': 20, 'output_tokens': 200}),
+    ]
+    stats = batch.summarize_model_stats('a', records)
+    assert stats['リクエスト数'] == 3
+    assert stats['エラー数'] == 1
+    assert stats['平均レイテンシ(秒)'] == pytest.approx(2.0)
+    assert (stats['p50レイテンシ(秒)'], stats['p95レイテンシ(秒)'], stats['最大レイテンシ(秒)']) == (2.0, 3.0, 3.0)
+    assert (stats['入力トークン合計'], stats['出力トークン合計']) == (30, 300)
+
+
+def test_models_are_deduplicated_and_unsupported_options_are_rejected():
+    assert batch.parse_arguments(['--models', 'a,b,a']).models == ['a', 'b']
+    for extra in (['--dedupe'], ['--continuity'], ['--requeue-duplicates'], ['--dedupe-threshold', '0.5']):
+        with pytest.raises(SystemExit):
+            batch.parse_arguments(['--models', 'a,b'] + extra)
+    with pytest.raises(SystemExit):
+        batch.parse_arguments(['--rpm', '0'])
+
+
+def test_fanout_keeps_other_models_when_one_fails_and_merges_stats(fanout_files, monkeypatch):
+    def create_model(name):
+        if name == 'broken':
+            raise RuntimeError('モデルが見つかりません')
+        return StubModel(name, [])
+
+    monkeypatch.setattr(batch.genai, 'GenerativeModel', create_model)
+    batch.process_prompts_fanout(['a', 'broken', 'a'], requests_per_minute=6000)
+    result = pd.read_csv(fanout_files['FANOUT_CSV_FILE'])
+    assert result['生成結果_a'].map(batch.is_generated).all()
+    assert result['生成結果_broken'].isna().all()
+
+    # 再開時は未処理のモデルだけを処理し、統計には以前の実行分も含める
+    batch.process_prompts_fanout(['a', 'b'], requests_per_minute=6000)
+    result = pd.read_csv(fanout_files['FANOUT_CSV_FILE'])
+    assert result['生成結果_b'].map(batch.is_generated).all()
+    stats = pd.read_csv(fanout_files['MODEL_STATS_CSV_FILE']).set_index('モデル')
+    assert stats.loc['a', 'リクエスト数'] == 3
+    assert stats.loc['b', 'リクエスト数'] == 3